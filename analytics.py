@@ -0,0 +1,315 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import engine
+import handlog
+from evaluator import evaluate_seven_batch, evaluate_three_batch
+from infoset import BUCKETS, hand_bucket
+
+# python analytics.py hands.cols --build hands.log
+# python analytics.py hands.cols --variant threehand
+# columnar views of hand logs (handlog.py). --build turns a log into a directory of .npy
+# columns, one table of hands and one of actions, written chunk by chunk straight from the
+# mapped log. Queries open the columns memory-mapped and only read the ones they use; every
+# group-by is a bincount over a key column, so there is no per-hand Python anywhere.
+#
+# hand columns: variant, player_is_bb, cards (the 11 logged deck cards), player_start,
+# bot_start, player_end, bot_end, winner (handlog.WINNERS code), showdown, net_bb (the
+# player's result in big blinds), first_action and n_actions (its rows in the action table),
+# bot_bucket (infoset bucket of the bot's dealt cards, NO_BUCKET in holdem) and player_category /
+# bot_category (hand category each seat held at the end, on the final switch cards)
+# action columns: hand, player, action (engine.action_codes), amount, pot, facing (the bet or
+# raise this action answers, 0 when it answers none)
+CHUNK_RECORDS = 1 << 22
+NO_BUCKET = 255
+THREE_CATEGORIES = ["high card", "pair", "flush", "straight", "triple", "straight flush"]
+FIVE_CATEGORIES = ["high card", "pair", "two pair", "trips", "straight", "flush", "full house", "quads", "straight flush"]
+BET_STEP = 0.5  # fold frequencies group bet sizes to the nearest half BB
+
+HAND_COLUMNS = {
+	'variant': np.uint8,
+	'player_is_bb': np.bool_,
+	'cards': (np.uint8, handlog.DECK_CARDS),
+	'player_start': np.float32,
+	'bot_start': np.float32,
+	'player_end': np.float32,
+	'bot_end': np.float32,
+	'winner': np.uint8,
+	'showdown': np.bool_,
+	'net_bb': np.float32,
+	'first_action': np.int64,
+	'n_actions': np.uint16,
+	'bot_bucket': np.uint8,
+	'player_category': np.uint8,
+	'bot_category': np.uint8,
+}
+ACTION_COLUMNS = {
+	'hand': np.int64,
+	'player': np.uint8,
+	'action': np.uint8,
+	'amount': np.float32,
+	'pot': np.float32,
+	'facing': np.float32,
+}
+BETS = (engine.action_codes["BET"], engine.action_codes["RAISE"])
+FIRST_SWITCH_ACTION = engine.action_codes["card_0"]
+
+
+def build_bucket_table():
+	# infoset bucket by the top 8 bits of a 3-card strength: category and top value
+	table = np.zeros(1 << 8, dtype=np.uint8)
+	for category in range(len(THREE_CATEGORIES)):
+		for value in range(16):
+			table[category << 4 | value] = hand_bucket(category, value)
+	return table
+
+BUCKET_TABLE = build_bucket_table()
+big_blinds = np.array([engine.VARIANTS[variant]['big_blind'] for variant in handlog.VARIANTS], dtype=np.float32)
+
+
+def column_path(directory, table, name):
+	return os.path.join(directory, f"{table}.{name}.npy")
+
+def create_columns(directory, table, columns, n):
+	arrays = {}
+	for name, dtype in columns.items():
+		dtype, width = dtype if isinstance(dtype, tuple) else (dtype, None)
+		shape = (n, width) if width else (n,)
+		arrays[name] = np.lib.format.open_memmap(column_path(directory, table, name), mode='w+', dtype=dtype, shape=shape)
+	return arrays
+
+def load(directory):
+	# (hands, actions), dicts of read-only memory-mapped columns
+	hands = {name: np.load(column_path(directory, 'hand', name), mmap_mode='r') for name in HAND_COLUMNS}
+	actions = {name: np.load(column_path(directory, 'action', name), mmap_mode='r') for name in ACTION_COLUMNS}
+	return hands, actions
+
+
+def complete_span(records):
+	# first DEAL to last END: whole hands only, a torn hand at the tail of a live log is left out
+	types = records[:, 0]
+	head = np.flatnonzero(types[:1 << 16] == handlog.DEAL)
+	tail = 0
+	for end in range(len(records), 0, -(1 << 16)):
+		ends = np.flatnonzero(types[max(end - (1 << 16), 0):end] == handlog.END)
+		if len(ends):
+			tail = max(end - (1 << 16), 0) + ends[-1] + 1
+			break
+	return (head[0], tail) if len(head) and tail > head[0] else (0, 0)
+
+def chunk_bounds(records, start, stop, chunk_records):
+	# chunks cut after an END record, so no hand straddles two
+	while start < stop:
+		end = min(start + chunk_records, stop)
+		if end < stop:
+			end = start + np.flatnonzero(records[start:end, 0] == handlog.END)[-1] + 1
+		yield start, end
+		start = end
+
+def final_player_cards(variant, cards, actions, first, n):
+	# switch hands with card swaps replayed through the engine for the player's final cards.
+	# Only the human seat swaps, so these are the few hands played in 3handswitchpoker.py
+	hands = []
+	for i in range(len(variant)):
+		state = engine.new_game(handlog.VARIANTS[variant[i]])
+		state.player_is_bb = True  # only the deck matters here, deal() flips this to False
+		engine.deal(state, deck=bytes(cards[i]) + bytes(c for c in range(52) if c not in cards[i]))
+		for row in range(first[i], first[i] + n[i]):
+			if not state.hand_over:
+				engine.apply_action(state, (int(actions['player'][row]), engine.ACTIONS[actions['action'][row]], 0))
+		hands.append(list(state.hands[0]))
+	return np.array(hands, dtype=np.int64).reshape(-1, 3)
+
+def categories(variant_code, cards, switched):
+	# (player, bot) categories at showdown: 3-card strengths >> 12, 7-card strengths >> 20
+	variant = handlog.VARIANTS[variant_code]
+	cards = cards.astype(np.int64)
+	if variant == 'holdem':
+		board = cards[:, 4:9]
+		return (evaluate_seven_batch(np.hstack([cards[:, 0:2], board])) >> 20,
+			evaluate_seven_batch(np.hstack([cards[:, 2:4], board])) >> 20)
+	player = cards[:, 0:3].copy()
+	rows, final = switched
+	if len(rows):
+		player[rows] = final
+	return evaluate_three_batch(player) >> 12, evaluate_three_batch(cards[:, 3:6]) >> 12
+
+def build_chunk(records, hands, actions, hand_offset, action_offset):
+	types = records[:, 0]
+	deal_rows = np.flatnonzero(types == handlog.DEAL)
+	end_rows = np.flatnonzero(types == handlog.END)
+	action_rows = np.flatnonzero(types == handlog.ACTION)
+	if len(deal_rows) != len(end_rows) or np.any(end_rows < deal_rows) or np.any(deal_rows[1:] < end_rows[:-1]) or np.any(types[deal_rows + 1] != handlog.START):
+		raise ValueError("malformed hand log: records out of hand order")
+	n, m = len(deal_rows), len(action_rows)
+	deals = records[deal_rows].view(handlog.DEAL_DTYPE).ravel()
+	starts = records[deal_rows + 1].view(handlog.CHIPS_DTYPE).ravel()
+	ends = records[end_rows].view(handlog.CHIPS_DTYPE).ravel()
+	moves = records[action_rows].view(handlog.ACTION_DTYPE).ravel()
+
+	h = slice(hand_offset, hand_offset + n)
+	variant = deals['variant']
+	hands['variant'][h] = variant
+	hands['player_is_bb'][h] = deals['player_is_bb'] != 0
+	hands['cards'][h] = deals['cards']
+	hands['player_start'][h] = starts['player_stacks']
+	hands['bot_start'][h] = starts['bot_stacks']
+	hands['player_end'][h] = ends['player_stacks']
+	hands['bot_end'][h] = ends['bot_stacks']
+	hands['winner'][h] = ends['flags'] & 3
+	hands['showdown'][h] = (ends['flags'] & handlog.SHOWDOWN) != 0
+	hands['net_bb'][h] = (ends['player_stacks'] - starts['player_stacks']) / big_blinds[variant]
+
+	hand = np.searchsorted(deal_rows, action_rows, 'right') - 1
+	n_actions = np.bincount(hand, minlength=n)
+	first = np.cumsum(n_actions) - n_actions
+	hands['n_actions'][h] = n_actions
+	hands['first_action'][h] = first + action_offset
+
+	a = slice(action_offset, action_offset + m)
+	player = moves['move'] >> 7
+	code = moves['move'] & 0x7f
+	actions['hand'][a] = hand + hand_offset
+	actions['player'][a] = player
+	actions['action'][a] = code
+	actions['amount'][a] = moves['amount']
+	actions['pot'][a] = moves['pot']
+	# a betting action faces the previous betting action of its hand when that was the other seat's bet or raise
+	betting = np.flatnonzero(code < FIRST_SWITCH_ACTION)
+	facing = np.zeros(m, dtype=np.float32)
+	previous, current = betting[:-1], betting[1:]
+	answers = (hand[previous] == hand[current]) & np.isin(code[previous], BETS) & (player[previous] != player[current])
+	facing[current[answers]] = moves['amount'][previous[answers]]
+	actions['facing'][a] = facing
+
+	cards = deals['cards']
+	bot_bucket = np.full(n, NO_BUCKET, dtype=np.uint8)
+	player_category = np.zeros(n, dtype=np.uint8)
+	bot_category = np.zeros(n, dtype=np.uint8)
+	for variant_code in np.unique(variant):
+		rows = np.flatnonzero(variant == variant_code)
+		if handlog.VARIANTS[variant_code] == 'switch':
+			swapped = np.unique(hand[code >= FIRST_SWITCH_ACTION])
+			swapped = swapped[variant[swapped] == variant_code]
+			final = final_player_cards(variant[swapped], cards[swapped], {'player': player, 'action': code}, first[swapped], n_actions[swapped])
+			switched = (np.searchsorted(rows, swapped), final)
+		else:
+			switched = ((), None)
+		player_category[rows], bot_category[rows] = categories(variant_code, cards[rows], switched)
+		if handlog.VARIANTS[variant_code] != 'holdem':
+			bot_bucket[rows] = BUCKET_TABLE[evaluate_three_batch(cards[rows, 3:6].astype(np.int64)) >> 8]
+	hands['bot_bucket'][h] = bot_bucket
+	hands['player_category'][h] = player_category
+	hands['bot_category'][h] = bot_category
+	return n, m
+
+def build(log_path, directory, chunk_records=CHUNK_RECORDS):
+	# writes the columns of every complete hand in the log, returns (hands, actions) counted
+	records = handlog.load_records(log_path)
+	start, stop = complete_span(records)
+	n = m = 0
+	for chunk_start in range(start, stop, 1 << 24):
+		types = records[chunk_start:min(chunk_start + (1 << 24), stop), 0]
+		n += int(np.count_nonzero(types == handlog.DEAL))
+		m += int(np.count_nonzero(types == handlog.ACTION))
+	os.makedirs(directory, exist_ok=True)
+	hands = create_columns(directory, 'hand', HAND_COLUMNS, n)
+	actions = create_columns(directory, 'action', ACTION_COLUMNS, m)
+	hand_offset = action_offset = 0
+	for chunk_start, chunk_end in chunk_bounds(records, start, stop, chunk_records):
+		built_hands, built_actions = build_chunk(np.ascontiguousarray(records[chunk_start:chunk_end]), hands, actions, hand_offset, action_offset)
+		hand_offset += built_hands
+		action_offset += built_actions
+	for column in list(hands.values()) + list(actions.values()):
+		column.flush()
+	return n, m
+
+
+def variant_mask(hands, variant):
+	return None if variant is None else np.asarray(hands['variant']) == handlog.variant_codes[variant]
+
+def both(mask, other):
+	return other if mask is None else mask & other
+
+def group(keys, size, mask=None, weights=None):
+	# per-key row counts (weight sums if weights are given) over keys 0..size-1. Rows outside
+	# mask go to an extra bin that is dropped, which is cheaper than compacting the columns.
+	# Keys stay int32 and are updated in place, these passes are bound by memory bandwidth
+	if mask is None:
+		return np.bincount(keys, weights, minlength=size)
+	keys = np.add(keys, 1, dtype=np.int32)
+	keys *= mask
+	return np.bincount(keys, weights, minlength=size + 1)[1:]
+
+def win_rate_by_bucket(hands, variant='threehand'):
+	# per infoset bucket of the bot's cards: hands, bot win rate and the bot's net BB per hand
+	buckets = np.asarray(hands['bot_bucket'])
+	mask = both(variant_mask(hands, variant), buckets != NO_BUCKET)
+	outcomes = len(handlog.WINNERS)
+	keys = buckets.astype(np.int32) * outcomes
+	keys += hands['winner']
+	counts = group(keys, len(BUCKETS) * outcomes, mask).reshape(-1, outcomes)
+	net = group(buckets, len(BUCKETS), mask, hands['net_bb'])
+	totals = counts.sum(axis=1)
+	wins = counts[:, handlog.winner_codes["bot"]]
+	return [(BUCKETS[b], totals[b], wins[b] / totals[b], -net[b] / totals[b]) for b in np.flatnonzero(totals)]
+
+def fold_frequency_by_bet(hands, actions, variant=None, player=None):
+	# per bet size faced (rounded to BET_STEP): answers, and how often the answer was a fold
+	steps = np.rint(np.asarray(actions['facing']) / BET_STEP).astype(np.int32)
+	mask = steps > 0
+	if player is not None:
+		mask &= np.asarray(actions['player']) == player
+	if variant is not None:
+		mask &= variant_mask(hands, variant)[actions['hand']]
+	size = int(steps.max()) + 1 if len(steps) else 1
+	keys = steps * 2
+	keys += np.asarray(actions['action']) == engine.action_codes["FOLD"]
+	counts = group(keys, size * 2, mask).reshape(-1, 2)
+	totals = counts.sum(axis=1)
+	return [(step * BET_STEP, totals[step], counts[step, 1] / totals[step]) for step in np.flatnonzero(totals)]
+
+def showdown_categories(hands, variant):
+	# share of showdowns by each seat's category and by the winning hand's category
+	names = FIVE_CATEGORIES if variant == 'holdem' else THREE_CATEGORIES
+	mask = variant_mask(hands, variant) & np.asarray(hands['showdown'])
+	player = np.asarray(hands['player_category'])
+	bot = np.asarray(hands['bot_category'])
+	winning = np.where(np.asarray(hands['winner']) == handlog.winner_codes["bot"], bot, player)
+	total = max(np.count_nonzero(mask), 1)
+	shares = [group(column, len(names), mask) / total for column in (player, bot, winning)]
+	return [(name, shares[0][c], shares[1][c], shares[2][c]) for c, name in enumerate(names)]
+
+
+def report(directory, variant=None):
+	hands, actions = load(directory)
+	started = time.perf_counter()
+	variants = [variant] if variant else [v for v in handlog.VARIANTS if np.any(variant_mask(hands, v))]
+	print(f"{len(hands['variant'])} hands, {len(actions['hand'])} actions")
+	for v in variants:
+		if v != 'holdem':
+			print(f"\n{v}: bot win rate by infoset bucket")
+			for bucket, count, win_rate, net in win_rate_by_bucket(hands, v):
+				print(f"  {bucket:16s} {count:12d} hands  win {win_rate:.4f}  {net:+8.3f} BB/hand")
+		print(f"\n{v}: fold frequency by bet faced")
+		for bet, count, folds in fold_frequency_by_bet(hands, actions, v):
+			print(f"  {bet:8g} BB {count:12d} answers  fold {folds:.4f}")
+		print(f"\n{v}: showdown categories (player / bot / winning hand)")
+		for name, player, bot, winning in showdown_categories(hands, v):
+			print(f"  {name:16s} {player:.4f}  {bot:.4f}  {winning:.4f}")
+	print(f"\nqueries took {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="hand-history columns and reports")
+	parser.add_argument('directory', help="column directory")
+	parser.add_argument('--build', metavar='LOG', help="(re)build the columns from this hand log first")
+	parser.add_argument('--variant', choices=handlog.VARIANTS)
+	args = parser.parse_args()
+	if args.build:
+		started = time.perf_counter()
+		n, m = build(args.build, args.directory)
+		print(f"built {n} hands, {m} actions in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+	report(args.directory, args.variant)
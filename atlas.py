@@ -0,0 +1,72 @@
+import os
+import sys
+import pygame
+from cards import ranks, suits
+
+# the 500x726 card PNGs are scaled once per card size into a sprite sheet, ranks across and suits
+# down with card_back.png on a fifth row, saved next to them. Later launches decode that one
+# image and hand out subsurfaces, so nothing is rescaled and every face shares one pixel buffer
+CARD_DIR = 'cards'
+CACHE_DIR = os.path.join(CARD_DIR, '.cache')
+
+
+def source_files(card_dir=CARD_DIR):
+	files = {(rank, suit): os.path.join(card_dir, f'{rank}_of_{suit}.png') for suit in suits for rank in ranks}
+	files['back'] = os.path.join(card_dir, 'card_back.png')
+	return files
+
+def slot(key):
+	# (column, row) of a card in the sheet
+	if key == 'back':
+		return 0, len(suits)
+	rank, suit = key
+	return ranks.index(rank), suits.index(suit)
+
+def atlas_path(width, height, cache_dir=CACHE_DIR):
+	return os.path.join(cache_dir, f'atlas_{width}x{height}.png')
+
+def is_stale(path, files):
+	try:
+		built = os.path.getmtime(path)
+	except OSError:
+		return True
+	return any(os.path.getmtime(source) > built for source in files.values() if os.path.exists(source))
+
+def build_atlas(width, height, files):
+	sheet = pygame.Surface((width * len(ranks), height * (len(suits) + 1)), pygame.SRCALPHA)
+	for key, source in files.items():
+		if not os.path.exists(source):
+			continue
+		column, row = slot(key)
+		sheet.blit(pygame.transform.scale(pygame.image.load(source), (width, height)), (column * width, row * height))
+	return sheet
+
+def load_atlas(width, height, card_dir=CARD_DIR, cache_dir=CACHE_DIR):
+	# {(rank, suit): surface} plus 'back', every surface a subsurface of one sheet
+	files = source_files(card_dir)
+	path = atlas_path(width, height, cache_dir)
+	if is_stale(path, files):
+		sheet = build_atlas(width, height, files)
+		try:
+			os.makedirs(cache_dir, exist_ok=True)
+			tmp_path = path[:-4] + '.tmp.png'
+			pygame.image.save(sheet, tmp_path)
+			os.replace(tmp_path, path)
+		except (OSError, pygame.error):
+			pass  # read-only install, keep the sheet built in memory
+	else:
+		sheet = pygame.image.load(path)
+	if pygame.display.get_surface() is not None:
+		sheet = sheet.convert_alpha()  # match the display format once instead of on every blit
+	images = {}
+	for key in files:
+		column, row = slot(key)
+		images[key] = sheet.subsurface((column * width, row * height, width, height))
+	return images
+
+
+if __name__ == '__main__':
+	# python atlas.py [width height] prebuilds the sheet, e.g. for a HiDPI size
+	width, height = (int(sys.argv[1]), int(sys.argv[2])) if len(sys.argv) > 2 else (100, 145)
+	load_atlas(width, height)
+	print(f"built {atlas_path(width, height)}")
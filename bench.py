@@ -0,0 +1,318 @@
+import argparse
+import fnmatch
+import importlib
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from itertools import cycle
+import numpy as np
+
+# python bench.py --output baseline.json
+# python bench.py --compare baseline.json
+# headless speed checks for the hot paths: hand evaluation, showdowns, bot decisions, loading the
+# strategy table and drawing frames (SDL's dummy video driver, no window). Every case runs on
+# inputs from fixed seeds. Latency percentiles are per call over about SAMPLES short samples,
+# each `inner` back-to-back calls filling about SAMPLE_SECONDS. Throughput is the median of
+# REPEATS longer runs of about RUN_SECONDS each, taken in rounds over all the cases (see run).
+# A run of every case takes a minute or so, and unchanged code then compares within about 10%
+# on throughput and 15% on p99 even on a noisy 1-CPU VM
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+SAMPLES = 200
+SAMPLE_SECONDS = 0.002
+REPEATS = 15
+RUN_SECONDS = 0.05
+INPUTS = 4096
+BATCH = 8192
+STRATEGY_PATH = 'threehand1M.txt'
+SCRIPTS = {'threehand': '3handpoker', 'holdem': 'poker', 'switch': '3handswitchpoker'}
+THRESHOLD = 0.15
+TAIL_THRESHOLD = 1.0  # p99 is noisier than throughput, flag it only when it about doubles
+CALIBRATION = 'calibration'
+
+cases = []
+
+
+def case(name, samples=SAMPLES, ops=1):
+	# registers setup() -> zero-argument callable, or (callable, cleanup) when the case leaves
+	# something behind; ops is how many operations one call performs
+	def register(setup):
+		cases.append((name, setup, samples, ops))
+		return setup
+	return register
+
+def timed(fn, calls):
+	timer = time.perf_counter
+	start = timer()
+	for _ in range(calls):
+		fn()
+	return timer() - start
+
+def plan(fn):
+	# calls per latency sample and per throughput run, from a few samples after warming up
+	fn()  # warm caches and lazy tables
+	once = max(timed(fn, 1), 1e-9)
+	inner = max(1, int(SAMPLE_SECONDS / once))
+	once = max(np.median([timed(fn, inner) for _ in range(5)]) / inner, 1e-9)
+	return max(1, int(SAMPLE_SECONDS / once)), max(1, int(RUN_SECONDS / once))
+
+
+def dealt_states(variant, n=INPUTS, seed=0):
+	import engine
+	rng = random.Random(seed)
+	state = engine.new_game(variant)
+	return [engine.reset_round(state, rng) for _ in range(n)]
+
+def played_states(variant, n=INPUTS, seed=0):
+	# spots from random play, each a state where seat 1 is about to act
+	import engine
+	from bot import random_action
+	rng = random.Random(seed)
+	spots = []
+	state = engine.new_game(variant)
+	while len(spots) < n:
+		state = engine.top_up(engine.reset_round(state, rng))
+		while not state.hand_over and state.actions_taken < 8:
+			if state.to_act == 1:
+				spots.append(state.copy())
+			engine.apply_action(state, random_action(state, state.to_act, rng))
+	return spots[:n]
+
+def next_call(fn, inputs):
+	items = cycle(inputs)
+	return lambda: fn(next(items))
+
+
+@case(CALIBRATION)
+def bench_calibration():
+	# fixed python and numpy work that calls none of the repo's code: its speed is the machine's,
+	# which compare takes out of every other case. It runs with every selection
+	rng = random.Random(0)
+	numbers = [rng.random() for _ in range(256)]
+	table = np.random.default_rng(0).integers(0, 1 << 20, 4096)
+	index = np.random.default_rng(1).integers(0, 4096, 4096)
+	def work():
+		total = 0
+		for i, x in enumerate(sorted(numbers)):
+			total += i * x
+		return total + int(table[index].sum())
+	return work
+
+@case('evaluate.three_card_strength')
+def bench_three():
+	from cards import decode_hand
+	from evaluator import three_card_strength
+	return next_call(three_card_strength, [decode_hand(state.hands[0]) for state in dealt_states('threehand')])
+
+@case('evaluate.seven_card_strength')
+def bench_seven():
+	from cards import decode_hand
+	from evaluator import seven_card_strength
+	return next_call(seven_card_strength, [decode_hand(state.hands[0] + state.community_cards) for state in dealt_states('holdem')])
+
+@case('evaluate.seven_batch', samples=50, ops=BATCH)
+def bench_seven_batch():
+	from dealer import deal_batch
+	from evaluator import evaluate_seven_batch
+	cards = deal_batch(BATCH, 7, 0).astype(np.int64)
+	return lambda: evaluate_seven_batch(cards)
+
+@case('showdown.threehand')
+def bench_showdown_threehand():
+	from engine import determine_winner
+	return next_call(determine_winner, dealt_states('threehand'))
+
+@case('showdown.holdem')
+def bench_showdown_holdem():
+	from engine import determine_winner
+	return next_call(determine_winner, dealt_states('holdem'))
+
+@case('showdown.holdem_batch', samples=50, ops=BATCH)
+def bench_showdown_batch():
+	from dealer import deal_variant, showdown_batch
+	decks = deal_variant('holdem', BATCH, 0)
+	return lambda: showdown_batch('holdem', decks)
+
+@case('bot.strategy_action')
+def bench_strategy_action():
+	from bot import strategy_action
+	from strategy import open_strategy
+	strategy = open_strategy(STRATEGY_PATH)
+	rng = random.Random(0)
+	return next_call(lambda state: strategy_action(state, 1, strategy, rng), played_states('threehand'))
+
+@case('bot.random_action')
+def bench_random_action():
+	from bot import random_action
+	rng = random.Random(0)
+	return next_call(lambda state: random_action(state, 1, rng), played_states('holdem'))
+
+@case('strategy.sample')
+def bench_strategy_sample():
+	from strategy import open_strategy
+	strategy = open_strategy(STRATEGY_PATH)
+	rng = random.Random(0)
+	codes = [code for code, _ in strategy.items()]
+	random.Random(0).shuffle(codes)
+	return next_call(lambda code: strategy.sample(code, rng), codes)
+
+@case('strategy.open', samples=50)
+def bench_strategy_open():
+	from strategy import open_strategy
+	return lambda: open_strategy(STRATEGY_PATH).close()
+
+@case('strategy.parse_and_compile', samples=5)
+def bench_strategy_compile():
+	import tempfile
+	from strategy import compile_strategy, parse_strategy_text
+	directory = tempfile.TemporaryDirectory()
+	out_path = os.path.join(directory.name, 'strategy.bin')
+	return lambda: compile_strategy(STRATEGY_PATH, out_path, parse_strategy_text(STRATEGY_PATH)), directory.cleanup
+
+
+def frame_cases(variant):
+	# one front end's drawing, imported only when one of its cases runs since importing opens the window
+	def load():
+		module = importlib.import_module(SCRIPTS[variant])
+		if not module.card_images:
+			module.load_card_images()
+			module.reset_round()
+		return module
+
+	def full():
+		module = load()
+		renderer = module.build_renderer()
+		def frame():
+			renderer.invalidate()
+			renderer.render()
+		return frame
+
+	def idle():
+		renderer = load().build_renderer()
+		renderer.render()
+		return renderer.render
+
+	def draw(name):
+		def setup():
+			module = load()
+			module.state.show_cards = True  # the busiest screen: river dealt, bot cards face up
+			module.state.round_stage = 3
+			if name == 'draw_hand':
+				return lambda: module.draw_hand(module.state.hands[0], 175, 500)
+			if name == 'draw_card_backs':
+				return lambda: module.draw_card_backs(175, 50)
+			return getattr(module, name)
+		return setup
+
+	case(f'frame.{variant}.full', samples=50)(full)
+	case(f'frame.{variant}.idle')(idle)
+	draws = ['draw_hand', 'draw_card_backs', 'draw_pot_size', 'draw_buttons', 'draw_player_info', 'draw_bot_hand']
+	if variant == 'holdem':
+		draws.append('draw_community_cards')
+	for name in draws:
+		case(f'frame.{variant}.{name}', samples=50)(draw(name))
+
+for variant in SCRIPTS:
+	frame_cases(variant)
+
+
+def run(patterns=None, quiet=False):
+	# REPEATS rounds over all the selected cases, each round taking a share of every case's latency
+	# samples and one throughput run, so a slow spell of the machine lands on one round of many
+	# cases instead of every sample of one case. Percentiles are the median over the rounds of
+	# each round's. Every throughput run comes right after a run of the calibration case, and
+	# 'calibrated' is the case's median speed relative to those, which is what compare goes by
+	results = {}
+	selected = []
+	try:
+		for name, setup, samples, ops in cases:
+			if patterns and name != CALIBRATION and not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+				continue
+			fn = setup()
+			fn, cleanup = fn if isinstance(fn, tuple) else (fn, None)
+			selected.append((name, fn, ops, cleanup))
+			inner, calls = plan(fn)
+			results[name] = {'inner': inner, 'runs': calls, 'per_round': math.ceil(samples / REPEATS)}
+		latencies = {name: [] for name, _, _, _ in selected}
+		runs = {name: [] for name, _, _, _ in selected}
+		calibration = next(fn for name, fn, _, _ in selected if name == CALIBRATION)
+		calibrations = {name: [] for name, _, _, _ in selected}
+		for _ in range(REPEATS):
+			for name, fn, ops, _ in selected:
+				result = results[name]
+				latencies[name].append([timed(fn, result['inner']) / (result['inner'] * ops) for _ in range(result['per_round'])])
+				calibrations[name].append(timed(calibration, results[CALIBRATION]['runs']))
+				runs[name].append(timed(fn, result['runs']) / (result['runs'] * ops))
+	finally:
+		for _, _, _, cleanup in selected:
+			if cleanup is not None:
+				cleanup()
+	for name, result in results.items():
+		result['samples'] = result.pop('per_round') * REPEATS
+		result['p50_us'], result['p90_us'], result['p99_us'] = (float(p) for p in np.median(np.percentile(latencies[name], [50, 90, 99], axis=1), axis=1) * 1e6)
+		result['ops_per_sec'] = 1 / np.median(runs[name])
+		result['calibrated'] = float(np.median(np.array(calibrations[name]) / results[CALIBRATION]['runs'] / np.array(runs[name])))
+		if not quiet:
+			print(f"{name:42s} {result['ops_per_sec']:14,.0f} ops/s  p50 {result['p50_us']:10.2f} us  p99 {result['p99_us']:10.2f} us", file=sys.stderr)
+	return {
+		'meta': {
+			'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+			'python': platform.python_version(),
+			'numpy': np.__version__,
+			'platform': platform.platform(),
+			'cpus': os.cpu_count(),
+		},
+		'results': results,
+	}
+
+def compare(baseline, current, threshold=THRESHOLD, tail_threshold=TAIL_THRESHOLD):
+	# cases whose throughput fell by more than threshold, or whose p99 rose by more than tail_threshold.
+	# Whole runs drift by 30% or more as the machine speeds up and slows down, so when both runs
+	# have the calibration case throughput is judged by the 'calibrated' speeds, which leave it out
+	shared = [name for name in current['results'] if name in baseline['results'] and name != CALIBRATION]
+	calibrated = CALIBRATION in baseline['results'] and CALIBRATION in current['results']
+	if calibrated:
+		drift = current['results'][CALIBRATION]['ops_per_sec'] / baseline['results'][CALIBRATION]['ops_per_sec']
+		print(f"machine speed {drift:.2f}x the baseline's, throughput ratios below are relative to that")
+	regressions = []
+	for name in shared:
+		result, base = current['results'][name], baseline['results'][name]
+		speed = result['calibrated'] / base['calibrated'] if calibrated else result['ops_per_sec'] / base['ops_per_sec']
+		tail = result['p99_us'] / base['p99_us'] if base['p99_us'] else 1.0
+		flagged = speed < 1 - threshold or tail > 1 + tail_threshold
+		print(f"{name:42s} {speed:6.2f}x ops/s  {tail:6.2f}x p99{'  REGRESSION' if flagged else ''}")
+		if flagged:
+			regressions.append(name)
+	return regressions
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="hot path benchmarks")
+	parser.add_argument('patterns', nargs='*', help="only cases matching these globs, e.g. 'bot.*'")
+	parser.add_argument('--output', help="write the results as JSON here, - for stdout")
+	parser.add_argument('--compare', help="baseline JSON to check the results against")
+	parser.add_argument('--threshold', type=float, default=THRESHOLD, help="allowed throughput drop before a case is flagged")
+	parser.add_argument('--tail-threshold', type=float, default=TAIL_THRESHOLD, help="allowed relative p99 rise")
+	parser.add_argument('--list', action='store_true')
+	args = parser.parse_args()
+	if args.list:
+		print('\n'.join(name for name, _, _, _ in cases))
+		sys.exit()
+	current = run(args.patterns)
+	if args.output == '-':
+		json.dump(current, sys.stdout, indent=1)
+	elif args.output:
+		with open(args.output, 'w') as f:
+			json.dump(current, f, indent=1)
+	if args.compare:
+		with open(args.compare) as f:
+			regressions = compare(json.load(f), current, args.threshold, args.tail_threshold)
+		if regressions:
+			print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+			sys.exit(1)
@@ -0,0 +1,93 @@
+import random
+from itertools import zip_longest
+from evaluator import three_card_strength_ids, unpack_three
+from infoset import encode_infoset, hand_bucket
+import metrics
+
+# policies take (state, player, rng) and return the (player, action, bet_amount) tuple to play
+
+
+def random_action(state, player, rng=random):
+	# the poker.py and 3handswitchpoker.py bot: call/check or a 2 BB bet/raise, half the time each
+	action = rng.choice(["CALL" if state.bet_made else "CHECK", "RAISE" if state.bet_made else "BET"])
+	return (player, action, 2)
+
+def bet_deltas(bet_history):
+	history = [entry[1] for entry in bet_history[2:]]
+	p0total = history[0::2]
+	p1total = history[1::2]
+	result0 = []
+	result1 = []  # never filled, so infosets only carry the first actor's deltas
+	if len(p0total) > 0:
+		result0 = [p0total[0]-1]
+		for i in range(1, len(p0total)):
+			result0.append(p0total[i] - p0total[i - 1]-1)
+	newresult = []
+	for a, b in zip_longest(result0, result1):
+		if a is not None:
+			newresult.append(a)
+		if b is not None:
+			newresult.append(b)
+	return p0total, p1total, result0, result1, newresult
+
+def strategy_infoset(state, player):
+	# infoset code of the player's spot, None if the bet deltas do not fit the encoding
+	p0total, p1total, result0, result1, newresult = bet_deltas(state.bet_history)
+	best_hand = unpack_three(three_card_strength_ids(*state.hands[player]))
+	try:
+		return encode_infoset(hand_bucket(best_hand[0], best_hand[1][0]), newresult)
+	except ValueError:
+		return None
+
+def choice_action(state, player, best_choice):
+	# map a sampled bet size onto the buttons
+	p0total, p1total, result0, result1, newresult = bet_deltas(state.bet_history)
+	bet_history = state.bet_history
+	bet_made = state.bet_made
+
+	bot = 0 if len(p0total) == len(p1total) else 1
+	own, other = (result0, result1) if bot == 0 else (result1, result0)
+	target = sum(own) + 1 + best_choice
+	action = ""
+	if len(other) > 0 and len(bet_history) == 3 and other[0] == 0 and best_choice == 0:
+		action = "CHECK"
+	elif target == bet_history.last():
+		action = "CALL"
+	elif best_choice == 0:
+		action = "FOLD"
+	elif target > bet_history.last():
+		action = "RAISE" if bet_made else "BET"
+	else:
+		action = "CALL" if bet_made else "CHECK"  # a size below the current bet, take the passive line instead of passing
+	if bot == 0:
+		return (player, action, sum(p0total) + 1 + best_choice)
+	return (player, action, sum(p1total) + 1 + best_choice)
+
+def strategy_action(state, player, strategy, rng=random):
+	# the 3handpoker.py bot: sample a bet size from the solver strategy and map it onto the buttons
+	code = strategy_infoset(state, player)
+	try:
+		if code is None:
+			raise KeyError(code)
+		best_choice = strategy.sample(code, rng)
+	except KeyError:
+		best_choice = 0  # an infoset the solver never reached, check/call if free or fold
+		metrics.inc('missing_infosets_total')
+	return choice_action(state, player, best_choice)
+
+def strategy_actions(states, player, strategy, rng=None):
+	# strategy_action for many tables at once, the bet sizes drawn in one numpy batch
+	codes = [strategy_infoset(state, player) for state in states]
+	known = [i for i, code in enumerate(codes) if code is not None and code in strategy]
+	choices = [0] * len(states)
+	if len(known) < len(states):
+		metrics.inc('missing_infosets_total', len(states) - len(known))
+	if known:
+		for i, choice in zip(known, strategy.sample_batch([codes[i] for i in known], rng).tolist()):
+			choices[i] = choice
+	return [choice_action(state, player, choice) for state, choice in zip(states, choices)]
+
+def strategy_policy(strategy):
+	def policy(state, player, rng=random):
+		return strategy_action(state, player, strategy, rng)
+	return policy
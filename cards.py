@@ -0,0 +1,24 @@
+suits = ['clubs', 'diamonds', 'hearts', 'spades']
+ranks = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'jack', 'queen', 'king', 'ace']
+rank_values = {r: i for i, r in enumerate(ranks, 2)}
+
+# card ids are rank_index * 4 + suit_index, so rank = id >> 2 and suit = id & 3
+id_cards = [(rank, suit) for rank in ranks for suit in suits]
+card_ids = {card: i for i, card in enumerate(id_cards)}
+
+
+def card_rank(card_id):
+	return card_id >> 2
+
+def card_suit(card_id):
+	return card_id & 3
+
+def card_value(card_id):
+	# same scale as rank_values, 2..14
+	return (card_id >> 2) + 2
+
+def encode_hand(hand):
+	return [card_ids[card] for card in hand]
+
+def decode_hand(ids):
+	return [id_cards[i] for i in ids]
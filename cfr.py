@@ -0,0 +1,247 @@
+import argparse
+import os
+import random
+import time
+from multiprocessing import Pool
+import numpy as np
+from evaluator import THREE_TABLE, unpack_three
+from infoset import BUCKETS, encode_infoset, hand_bucket
+from strategy import write_strategy_text
+
+# external-sampling MCCFR for the 3-card game, in the abstraction threehand1M.txt was solved in:
+# both players ante 1 BB out of a 20 BB stack, an action is the BBs added (0 checks or folds,
+# the amount to call calls, anything from twice the call up to all-in raises) and the fourth
+# action can only fold or call. An infoset is the mover's hand bucket plus the action history.
+# regrets and strategy sums are (bucket, action) arrays, action columns laid out per history
+STACK = 20
+MAX_ACTIONS = 4
+FOLD = -1
+SHOWDOWN = -2
+
+
+def legal_moves(history):
+	committed = [1, 1]
+	for i, amount in enumerate(history):
+		committed[i % 2] += amount
+	player = len(history) % 2
+	to_call = committed[1 - player] - committed[player]
+	room = STACK - committed[player]
+	moves = [0, to_call] if to_call else [0]
+	if len(history) < MAX_ACTIONS - 1:
+		moves += range(max(2 * to_call, to_call + 1), room + 1)
+		if room > to_call and moves[-1] != room:
+			moves.append(room)  # short all-in
+	return committed, moves
+
+def build_tree():
+	# every decision point of the betting tree, breadth first so the root is history 0
+	histories = [()]
+	offsets = []
+	children = []
+	stakes = []
+	n_actions = 0
+	for history in histories:
+		committed, moves = legal_moves(history)
+		player = len(history) % 2
+		to_call = committed[1 - player] - committed[player]
+		node_children = []
+		node_stakes = []
+		for move in moves:
+			if to_call and move == 0:
+				node_children.append(FOLD)
+				node_stakes.append(committed[player])
+			elif (to_call and move == to_call) or history == (0,) and move == 0:
+				node_children.append(SHOWDOWN)
+				node_stakes.append(committed[1 - player])
+			else:
+				node_children.append(len(histories))
+				node_stakes.append(0)
+				histories.append(history + (move,))
+		offsets.append(n_actions)
+		children.append(node_children)
+		stakes.append(node_stakes)
+		n_actions += len(moves)
+	return histories, offsets, children, stakes, n_actions
+
+HISTORIES, OFFSETS, CHILDREN, STAKES, N_ACTIONS = build_tree()
+MOVES = [legal_moves(history)[1] for history in HISTORIES]
+
+
+def build_strength_buckets():
+	# bucket of every 3-card strength, indexed by the packed strength
+	buckets = [0] * (max(THREE_TABLE) + 1)
+	for strength in set(THREE_TABLE):
+		category, values = unpack_three(strength)
+		buckets[strength] = hand_bucket(category, values[0])
+	return buckets
+
+STRENGTH_BUCKETS = build_strength_buckets()
+
+
+def current_strategy(regrets, base, count):
+	positive = [r if r > 0 else 0.0 for r in regrets[base:base + count]]
+	total = sum(positive)
+	if total > 0:
+		return [p / total for p in positive]
+	return [1.0 / count] * count
+
+def traverse(node, traverser, buckets, result, regrets, strategy_sum, rng):
+	# value of node for the traverser, who tries every move while the opponent's moves are sampled
+	player = len(HISTORIES[node]) % 2
+	children = CHILDREN[node]
+	stakes = STAKES[node]
+	count = len(children)
+	base = buckets[player] * N_ACTIONS + OFFSETS[node]
+	strategy = current_strategy(regrets, base, count)
+
+	if player != traverser:
+		for k in range(count):
+			strategy_sum[base + k] += strategy[k]
+		u = rng.random()
+		k = 0
+		while k < count - 1 and u >= strategy[k]:
+			u -= strategy[k]
+			k += 1
+		child = children[k]
+		if child == FOLD:
+			return stakes[k]
+		if child == SHOWDOWN:
+			return stakes[k] * result
+		return traverse(child, traverser, buckets, result, regrets, strategy_sum, rng)
+
+	values = []
+	for k in range(count):
+		child = children[k]
+		if child == FOLD:
+			values.append(-stakes[k])
+		elif child == SHOWDOWN:
+			values.append(stakes[k] * result)
+		else:
+			values.append(traverse(child, traverser, buckets, result, regrets, strategy_sum, rng))
+	node_value = sum(p * v for p, v in zip(strategy, values))
+	for k in range(count):
+		regrets[base + k] += values[k] - node_value
+	return node_value
+
+def run_iterations(regrets, strategy_sum, iterations, rng):
+	# regrets and strategy_sum are flat lists, updated in place
+	for _ in range(iterations):
+		cards = rng.sample(range(52), 6)
+		strengths = (THREE_TABLE[cards[0] * 2704 + cards[1] * 52 + cards[2]], THREE_TABLE[cards[3] * 2704 + cards[4] * 52 + cards[5]])
+		buckets = (STRENGTH_BUCKETS[strengths[0]], STRENGTH_BUCKETS[strengths[1]])
+		result = (strengths[0] > strengths[1]) - (strengths[0] < strengths[1])
+		traverse(0, 0, buckets, result, regrets, strategy_sum, rng)
+		traverse(0, 1, buckets, -result, regrets, strategy_sum, rng)
+
+def train_batch(args):
+	# one worker's share of a round, run against a snapshot and returned as deltas
+	regrets, strategy_sum, iterations, seed = args
+	regret_list = regrets.ravel().tolist()
+	strategy_list = strategy_sum.ravel().tolist()
+	run_iterations(regret_list, strategy_list, iterations, random.Random(seed))
+	return np.array(regret_list).reshape(regrets.shape) - regrets, np.array(strategy_list).reshape(strategy_sum.shape) - strategy_sum
+
+
+class Trainer:
+
+	def __init__(self, seed=0, plus=False):
+		self.regrets = np.zeros((len(BUCKETS), N_ACTIONS))
+		self.strategy_sum = np.zeros((len(BUCKETS), N_ACTIONS))
+		self.iterations = 0
+		self.rounds = 0
+		self.seed = seed
+		self.plus = plus
+
+	def train(self, iterations, workers=1, batch=1000, checkpoint=None, checkpoint_every=60.0, log=print):
+		# each round hands every worker `batch` iterations, the merged deltas are applied together
+		pool = Pool(workers) if workers > 1 else None
+		last_save = time.perf_counter()
+		try:
+			while self.iterations < iterations:
+				sizes = []
+				for _ in range(workers):
+					sizes.append(min(batch, iterations - self.iterations - sum(sizes)))
+				seeds = np.random.SeedSequence([self.seed, self.rounds]).generate_state(workers)
+				args = [(self.regrets, self.strategy_sum, size, int(s)) for size, s in zip(sizes, seeds) if size > 0]
+				for regret_delta, strategy_delta in (pool.imap(train_batch, args) if pool else map(train_batch, args)):
+					self.regrets += regret_delta
+					self.strategy_sum += strategy_delta
+				if self.plus:
+					np.maximum(self.regrets, 0, out=self.regrets)
+				self.iterations += sum(sizes)
+				self.rounds += 1
+				if checkpoint and time.perf_counter() - last_save >= checkpoint_every:
+					self.save(checkpoint)
+					last_save = time.perf_counter()
+					log(f"{self.iterations} iterations, checkpoint saved to {checkpoint}")
+		finally:
+			if pool:
+				pool.close()
+				pool.join()
+		if checkpoint:
+			self.save(checkpoint)
+		return self
+
+	def save(self, path):
+		tmp_path = path + '.tmp'
+		with open(tmp_path, 'wb') as f:
+			np.savez(f, regrets=self.regrets, strategy_sum=self.strategy_sum, iterations=self.iterations,
+				rounds=self.rounds, seed=self.seed, plus=self.plus)
+		os.replace(tmp_path, path)
+
+	@classmethod
+	def load(cls, path):
+		with np.load(path) as data:
+			if data['regrets'].shape != (len(BUCKETS), N_ACTIONS):
+				raise ValueError(f"{path} was written for a different betting tree")
+			trainer = cls(int(data['seed']), bool(data['plus']))
+			trainer.regrets = data['regrets']
+			trainer.strategy_sum = data['strategy_sum']
+			trainer.iterations = int(data['iterations'])
+			trainer.rounds = int(data['rounds'])
+		return trainer
+
+	def average_strategy(self):
+		# {infoset code: {move: probability}} for every infoset the opponent sampling reached
+		strategy_dict = {}
+		for node, history in enumerate(HISTORIES):
+			start = OFFSETS[node]
+			moves = MOVES[node]
+			for bucket in range(len(BUCKETS)):
+				row = self.strategy_sum[bucket, start:start + len(moves)]
+				total = row.sum()
+				if total > 0:
+					strategy_dict[encode_infoset(bucket, history)] = dict(zip(moves, (row / total).tolist()))
+		return strategy_dict
+
+	def write(self, path):
+		write_strategy_text(self.average_strategy(), path)
+		return path
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="train a threehand strategy with external-sampling MCCFR")
+	parser.add_argument('--iterations', type=int, default=1000000, help="total iterations, counting resumed ones")
+	parser.add_argument('--workers', type=int, default=os.cpu_count())
+	parser.add_argument('--batch', type=int, default=2000, help="iterations per worker between merges")
+	parser.add_argument('--seed', type=int, default=None, help="default 0; a resumed run keeps its checkpoint's")
+	parser.add_argument('--plus', action='store_true', default=None, help="floor regrets at zero after every merge; a resumed run keeps its checkpoint's setting")
+	parser.add_argument('--checkpoint', default='threehand_cfr.npz')
+	parser.add_argument('--resume', action='store_true')
+	parser.add_argument('--out', default='threehand_cfr.txt')
+	args = parser.parse_args()
+
+	if args.resume and os.path.exists(args.checkpoint):
+		trainer = Trainer.load(args.checkpoint)
+		if args.seed is not None and args.seed != trainer.seed:
+			parser.error(f"--seed {args.seed} but {args.checkpoint} was trained with seed {trainer.seed}")
+		if args.plus and not trainer.plus:
+			parser.error(f"--plus but {args.checkpoint} was trained with plain CFR")
+		print(f"resumed {args.checkpoint} at {trainer.iterations} iterations ({'CFR+' if trainer.plus else 'CFR'}, seed {trainer.seed})")
+	else:
+		trainer = Trainer(0 if args.seed is None else args.seed, bool(args.plus))
+	start = time.perf_counter()
+	done = trainer.iterations
+	trainer.train(args.iterations, args.workers, args.batch, args.checkpoint)
+	elapsed = time.perf_counter() - start
+	print(f"{trainer.iterations - done} iterations in {elapsed:.1f}s, wrote {trainer.write(args.out)}")
@@ -0,0 +1,78 @@
+import argparse
+import time
+import numpy as np
+import engine
+from evaluator import evaluate_seven_batch, evaluate_three_batch
+
+# python dealer.py --variant holdem --deals 1000000
+# batched dealing for simulation: n independent deals as one (n, k) uint8 array of card ids, each
+# row the first k cards of a shuffled deck in engine.deal's layout (seat 0's hole cards, seat 1's,
+# then the board at the variant's deck positions). The rows come from a Fisher-Yates pass run on
+# every row at once that stops after k cards, all drawn from one numpy Generator, so a seed and
+# batch size always give the same deals. Showdowns go straight to the batch evaluators
+DECK_SIZE = 52
+PLAYER, TIE, BOT = 1, 0, -1
+
+
+def generator(seed=None):
+	# a Generator is used as is, anything else seeds a new one
+	return seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+
+def deal_batch(n, k=DECK_SIZE, rng=None):
+	rng = generator(rng)
+	decks = np.empty((n, DECK_SIZE), dtype=np.uint8)
+	decks[:] = np.arange(DECK_SIZE, dtype=np.uint8)
+	rows = np.arange(n)
+	for i in range(k):
+		j = rng.integers(i, DECK_SIZE, size=n)
+		drawn = decks[rows, j]
+		decks[rows, j] = decks[:, i]
+		decks[:, i] = drawn
+	return np.ascontiguousarray(decks[:, :k])
+
+def deal_size(variant):
+	# cards a deal of this variant uses
+	rules = engine.VARIANTS[variant]
+	return rules['community'][1] if rules['community'] else 2 * rules['hole_cards']
+
+def deal_variant(variant, n, rng=None):
+	return deal_batch(n, deal_size(variant), rng)
+
+def split(variant, decks):
+	# views of the (n, k) deals: seat 0 hole cards, seat 1 hole cards, board (n, 0 for threehand)
+	rules = engine.VARIANTS[variant]
+	hole = rules['hole_cards']
+	start, end = rules['community'] or (2 * hole, 2 * hole)
+	return decks[:, :hole], decks[:, hole:2 * hole], decks[:, start:end]
+
+def showdown_batch(variant, decks):
+	# PLAYER, BOT or TIE per deal if both seats check it down, decided like engine.determine_winner
+	player, bot, board = split(variant, decks)
+	if variant == 'holdem':
+		player_strength = evaluate_seven_batch(np.hstack([player, board]).astype(np.int64))
+		bot_strength = evaluate_seven_batch(np.hstack([bot, board]).astype(np.int64))
+	else:
+		player_strength = evaluate_three_batch(player.astype(np.int64))
+		bot_strength = evaluate_three_batch(bot.astype(np.int64))
+	return np.sign(player_strength - bot_strength).astype(np.int8)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="batched deals and check-down showdowns")
+	parser.add_argument('--variant', choices=sorted(engine.VARIANTS), default='holdem')
+	parser.add_argument('--deals', type=int, default=1000000)
+	parser.add_argument('--batch', type=int, default=100000)
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args()
+	rng = generator(args.seed)
+	counts = np.zeros(3, dtype=np.int64)
+	dealing = evaluating = 0.0
+	for start in range(0, args.deals, args.batch):
+		t = time.perf_counter()
+		decks = deal_variant(args.variant, min(args.batch, args.deals - start), rng)
+		dealing += time.perf_counter() - t
+		t = time.perf_counter()
+		counts += np.bincount(showdown_batch(args.variant, decks) + 1, minlength=3)
+		evaluating += time.perf_counter() - t
+	print(f"{args.deals} {args.variant} deals: {args.deals / dealing:,.0f} deals/s dealt, {args.deals / evaluating:,.0f} showdowns/s")
+	print(f"player {counts[PLAYER + 1] / args.deals:.4f}  bot {counts[BOT + 1] / args.deals:.4f}  tie {counts[TIE + 1] / args.deals:.4f}")
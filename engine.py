@@ -0,0 +1,448 @@
+import random
+from array import array
+from cards import card_ids, ranks, suits
+from evaluator import seven_card_strength_ids, three_card_strength_ids
+
+# rules of the three front ends without pygame: poker.py is 'holdem', 3handpoker.py is 'threehand'
+# and 3handswitchpoker.py is 'switch'. Actions are (player, action, bet_amount) tuples with
+# player 0 the human seat and 1 the bot, exactly what the scripts pass to handle_action.
+# Cards are ids 0..51 (cards.py), decode_hand turns them back into the tuples the front ends draw
+VARIANTS = {
+	'holdem': {'hole_cards': 2, 'community': (4, 9), 'small_blind': 500, 'big_blind': 1000, 'blind': 0.5, 'stack': 100},
+	'threehand': {'hole_cards': 3, 'community': None, 'small_blind': 1000, 'big_blind': 1000, 'blind': 1, 'stack': 20},
+	'switch': {'hole_cards': 3, 'community': (6, 11), 'small_blind': 500, 'big_blind': 1000, 'blind': 0.5, 'stack': 100},
+}
+card_value_map = {f"card_{i}": i for i in range(5)}
+hand_value_map = {f"hand_{i}": i for i in range(5)}
+# every action name, numbered for the binary formats (server protocol, hand logs)
+ACTIONS = ["FOLD", "CHECK", "CALL", "BET", "RAISE"] + [f"card_{i}" for i in range(5)] + [f"hand_{i}" for i in range(3)]
+action_codes = {action: code for code, action in enumerate(ACTIONS)}
+MAX_ACTIONS_PER_HAND = 200
+# get_shuffled_deck's order, so a seeded rng deals the same cards as it did with tuple decks
+NEW_DECK = array('B', [card_ids[(rank, suit)] for suit in suits for rank in ranks])
+HISTORY_SIZE = 8
+DEAL_CHUNK = 4096  # run_hands deals this many hands per numpy draw
+
+
+class BetHistory:
+	# (player, amount in BB) entries in preallocated arrays, reused across streets and hands.
+	# indexing and iteration give the tuples the front ends and bot expect, with amounts that were
+	# passed as ints coming back as ints so the printed bets read the same
+	__slots__ = ('players', 'amounts', 'integral', 'length')
+
+	def __init__(self, entries=()):
+		self.players = array('b', bytes(HISTORY_SIZE))
+		self.amounts = array('d', bytes(8 * HISTORY_SIZE))
+		self.integral = array('b', bytes(HISTORY_SIZE))
+		self.length = 0
+		for entry in entries:
+			self.append(entry)
+
+	def __len__(self):
+		return self.length
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return self.to_list()[index]
+		if index < 0:
+			index += self.length
+		if not 0 <= index < self.length:
+			raise IndexError("bet history index out of range")
+		amount = self.amounts[index]
+		return (self.players[index], int(amount) if self.integral[index] else amount)
+
+	def __iter__(self):
+		return iter(self.to_list())
+
+	def __eq__(self, other):
+		return list(self) == list(other)
+
+	def __repr__(self):
+		return f"BetHistory({list(self)})"
+
+	def append(self, entry):
+		player, amount = entry
+		if self.length == len(self.amounts):
+			self.players.extend(self.players)  # a street with more raises than fit, double the arrays
+			self.amounts.extend(self.amounts)
+			self.integral.extend(self.integral)
+		self.players[self.length] = player
+		self.amounts[self.length] = amount
+		self.integral[self.length] = isinstance(amount, int)
+		self.length += 1
+
+	def clear(self):
+		self.length = 0
+
+	def copy(self):
+		new = BetHistory.__new__(BetHistory)
+		new.players = self.players[:]
+		new.amounts = self.amounts[:]
+		new.integral = self.integral[:]
+		new.length = self.length
+		return new
+
+	def last(self):
+		# amount of the latest entry, the bet to call
+		n = self.length - 1
+		if n < 0:
+			raise IndexError("bet history is empty")
+		return int(self.amounts[n]) if self.integral[n] else self.amounts[n]
+
+	def to_list(self):
+		n = self.length
+		return [(player, int(amount) if integral else amount) for player, amount, integral in zip(self.players[:n], self.amounts[:n], self.integral[:n])]
+
+
+class GameState:
+
+	__slots__ = ('variant', 'small_blind', 'big_blind', 'bet_made', 'player_is_bb', 'round_stage', 'pot_size',
+		'bot_stacks', 'player_stacks', 'hands', 'deck', 'community_cards', 'bet_history', 'show_cards', 'pre_flop',
+		'card_selected', 'card_switched', 'hand_over', 'winner', 'to_act', 'actions_taken')
+
+	def __init__(self, variant):
+		rules = VARIANTS[variant]
+		self.variant = variant
+		self.small_blind = rules['small_blind']
+		self.big_blind = rules['big_blind']
+		self.bet_made = True
+		self.player_is_bb = True
+		self.round_stage = 0
+		self.pot_size = 0
+		self.bot_stacks = self.big_blind * rules['stack']
+		self.player_stacks = self.big_blind * rules['stack']
+		self.hands = [array('B'), array('B')]
+		self.deck = array('B', NEW_DECK)
+		self.community_cards = array('B')
+		self.bet_history = blind_history(rules, self.player_is_bb)
+		self.show_cards = False
+		self.pre_flop = True
+		self.card_selected = ""
+		self.card_switched = False
+		self.hand_over = False
+		self.winner = None
+		self.to_act = 1
+		self.actions_taken = 0
+
+	def copy(self):
+		new = GameState.__new__(GameState)
+		for name in GameState.__slots__:
+			setattr(new, name, getattr(self, name))
+		new.hands = [hand[:] for hand in self.hands]
+		new.deck = self.deck[:]
+		new.community_cards = self.community_cards[:]
+		new.bet_history = self.bet_history.copy()
+		return new
+
+
+def blind_history(rules, player_is_bb, history=None):
+	# the two blind entries, written into history when one is given
+	history = BetHistory() if history is None else history
+	history.clear()
+	if player_is_bb:
+		history.append((1, rules['blind']))
+		history.append((0, 1))
+	else:
+		history.append((0, rules['blind']))
+		history.append((1, 1))
+	return history
+
+def shuffle_deck(deck, rng=random):
+	# back to the new-deck order and shuffled in place, the same permutation rng.shuffle gave a fresh list
+	deck[:] = NEW_DECK
+	rng.shuffle(deck)
+	return deck
+
+def get_shuffled_deck(rng=random):
+	return shuffle_deck(array('B', NEW_DECK), rng)
+
+def new_game(variant):
+	# the first reset_round flips player_is_bb, so the human starts as small blind like the scripts
+	return GameState(variant)
+
+def reset_round(state, rng=random, deck=None):
+	return deal(state.copy(), rng, deck)
+
+def deal(state, rng=random, deck=None):
+	# in-place reset_round for runners that own their state, reusing its deck and card arrays.
+	# deck, if given, is the card order to deal from as ids (a dealer.py row) or (rank, suit) tuples
+	rules = VARIANTS[state.variant]
+	hole = rules['hole_cards']
+	if state.player_stacks == 0:
+		state.player_stacks = state.big_blind * 20
+	state.bet_made = True
+	state.round_stage = 0
+	state.pot_size = 0
+	state.player_is_bb = not state.player_is_bb
+	if deck is None:
+		shuffle_deck(state.deck, rng)
+	else:
+		state.deck[:] = array('B', [card_ids[card] for card in deck] if isinstance(deck[0], tuple) else bytes(deck))
+	state.hands[0][:] = state.deck[0:hole]
+	state.hands[1][:] = state.deck[hole:2 * hole]
+	if rules['community']:
+		start, end = rules['community']
+		state.community_cards[:] = state.deck[start:end]
+	blind_history(rules, state.player_is_bb, state.bet_history)
+	state.show_cards = False
+	state.pre_flop = True
+	state.card_selected = ""
+	state.card_switched = False
+	state.hand_over = False
+	state.winner = None
+	state.to_act = 1 if state.player_is_bb else 0
+	state.actions_taken = 0
+	return state
+
+def top_up(state):
+	# back to starting stacks, so every simulated hand is played at full depth
+	stack = VARIANTS[state.variant]['stack']
+	state.player_stacks = state.big_blind * stack
+	state.bot_stacks = state.big_blind * stack
+	return state
+
+def determine_winner(state):
+	if state.variant == 'holdem':
+		player_best = seven_card_strength_ids(state.hands[0] + state.community_cards)
+		bot_best = seven_card_strength_ids(state.hands[1] + state.community_cards)
+	else:
+		player_best = three_card_strength_ids(*state.hands[0])
+		bot_best = three_card_strength_ids(*state.hands[1])
+	if player_best > bot_best:
+		return "player"
+	elif bot_best > player_best:
+		return "bot"
+	else:
+		return "tie"
+
+def valid_raise(state, bet_amount):
+	highest_bet = 0
+	for i, j in state.bet_history:
+		if j > highest_bet:
+			highest_bet = j
+	return bet_amount >= 2 * highest_bet
+
+def legal_actions(state):
+	# the three buttons the front ends show, minus raises once threehand reaches round 4/4
+	actions = ["FOLD", "CALL" if state.bet_made else "CHECK"]
+	if state.variant != 'threehand' or len(state.bet_history) - 2 < 3:
+		actions.append("RAISE" if state.bet_made else "BET")
+	return actions
+
+def highest_bet(state, player):
+	highest = 0
+	for i, j in state.bet_history:
+		if i == player and j > highest:
+			highest = j
+	return highest
+
+def settle_showdown(state):
+	state.winner = determine_winner(state)
+	if state.winner == "player":
+		state.player_stacks += state.pot_size
+	elif state.winner == "bot":
+		state.bot_stacks += state.pot_size
+	else:
+		state.player_stacks += state.pot_size/2
+		state.bot_stacks += state.pot_size/2
+
+def collect_call(state):
+	called = state.bet_history.last() * state.big_blind
+	state.pot_size += called * 2
+	state.player_stacks -= called
+	state.bot_stacks -= called
+
+def fold(state, player):
+	if player == 0:
+		state.winner = "bot"
+		state.bot_stacks += state.pot_size
+		lost = highest_bet(state, 0) * state.big_blind
+		state.bot_stacks += lost
+		state.player_stacks -= lost
+	else:
+		state.winner = "player"
+		state.player_stacks += state.pot_size
+		lost = highest_bet(state, 1) * state.big_blind
+		state.player_stacks += lost
+		state.bot_stacks -= lost
+	if state.player_stacks == 0:
+		state.player_stacks = state.big_blind * 20
+	state.hand_over = True
+
+def apply_threehand(state, action, bet_amount, player):
+	if action == "BET" or action == "RAISE":
+		if bet_amount > state.bot_stacks and player == 1:
+			bet_amount = state.bot_stacks
+		elif bet_amount > 20:
+			bet_amount = 20
+		state.pre_flop = False
+		state.bet_history.append((player, bet_amount))
+		state.bet_made = True
+	elif action == "CALL":
+		last = state.bet_history.last()
+		if last > state.player_stacks and player == 0:
+			state.pot_size += last * state.big_blind + state.player_stacks
+			state.player_stacks = 0
+			state.bot_stacks -= last * state.big_blind
+			state.show_cards = True
+			settle_showdown(state)
+			state.bet_made = False
+		elif last > state.bot_stacks and player == 1:
+			collect_call(state)
+			state.show_cards = True
+			settle_showdown(state)
+			state.bet_made = False
+		elif state.pre_flop and len(state.bet_history) == 2:
+			state.bet_made = False
+			state.bet_history.append((player, last))
+		else:
+			collect_call(state)
+			state.show_cards = True
+			settle_showdown(state)
+			state.bet_made = False
+	elif action == "CHECK":
+		if (player == 0 and state.player_is_bb) or (player == 1 and not state.player_is_bb):
+			state.show_cards = True
+			settle_showdown(state)
+		elif state.pre_flop and len(state.bet_history) == 3:
+			state.pre_flop = False
+			collect_call(state)
+			settle_showdown(state)
+			state.bet_made = False
+	if state.show_cards:
+		state.hand_over = True
+
+def switch_cards(state, action):
+	# the switch game lets the human trade one hand card for one community card per street
+	if state.card_switched:
+		return
+	if action == state.card_selected:
+		state.card_selected = ""
+	elif action in card_value_map and (state.card_selected in card_value_map or state.card_selected == ""):
+		state.card_selected = action
+	elif action in hand_value_map and (state.card_selected in hand_value_map or state.card_selected == ""):
+		state.card_selected = action
+	else:
+		if action in card_value_map:
+			hand_index, card_index = hand_value_map[state.card_selected], card_value_map[action]
+		else:
+			hand_index, card_index = hand_value_map[action], card_value_map[state.card_selected]
+		state.hands[0][hand_index], state.community_cards[card_index] = state.community_cards[card_index], state.hands[0][hand_index]
+		state.card_switched = True
+		state.card_selected = ""
+
+def apply_streets(state, action, bet_amount, player):
+	# poker.py and 3handswitchpoker.py: four streets, showdown after the last one
+	history = state.bet_history
+	if action == "BET" or action == "RAISE":
+		state.pre_flop = False
+		history.append((player, bet_amount))
+		state.bet_made = True
+		return
+	if action == "CALL":
+		if state.pre_flop and history.length == 2:
+			state.bet_made = False
+			history.append((player, history.last()))
+		else:
+			collect_call(state)
+			if state.round_stage >= 3:
+				state.show_cards = True
+				settle_showdown(state)
+			state.bet_made = False
+	elif action == "CHECK":
+		if state.round_stage >= 3 and ((player == 0 and state.player_is_bb) or (player == 1 and not state.player_is_bb)):
+			state.show_cards = True
+			settle_showdown(state)
+		elif state.pre_flop and history.length == 3:
+			state.pre_flop = False
+			collect_call(state)
+
+	if (action == "CALL" and not state.pre_flop) or (action == "CHECK" and (player == 1) != state.player_is_bb):
+		state.round_stage += 1
+		state.bet_history.clear()
+		state.card_switched = False
+		state.to_act = 1 if state.player_is_bb else 0
+	if state.round_stage >= 4:
+		state.hand_over = True
+
+def apply_action(state, action):
+	# in-place transition, for runners that own their state
+	player, name, bet_amount = action
+	if state.hand_over:
+		raise ValueError(f"hand is over, reset_round before {name}")
+	if state.variant == 'switch' and (name in card_value_map or name in hand_value_map):
+		switch_cards(state, name)  # selecting and swapping cards does not use up the turn
+		return state
+	state.to_act = 1 - player
+	state.actions_taken += 1
+	if name == "FOLD":
+		fold(state, player)
+	elif state.variant == 'threehand':
+		apply_threehand(state, name, bet_amount, player)
+	else:
+		apply_streets(state, name, bet_amount, player)
+	return state
+
+def step(state, action):
+	# pure transition: returns the next state and leaves state untouched
+	return apply_action(state.copy(), action)
+
+def action_log(previous, action, state):
+	# the lines the front ends print for an action
+	player, name, bet_amount = action
+	if name == "FOLD":
+		lines = [f"{player}: FOLD"]
+	elif name == "BET" or name == "RAISE":
+		lines = [f"{player}: {name} {state.bet_history.last()} BB"]
+	elif name == "CALL":
+		lines = [f"{player}: CALL {previous.bet_history.last()} BB"]
+	elif name == "CHECK":
+		lines = [f"{player}: CHECK"]
+	else:
+		lines = []
+	if state.winner and not previous.winner:
+		lines.append({"player": "Player Wins!", "bot": "Bot Wins!", "tie": "Tie!"}[state.winner])
+	return lines
+
+
+def play_hand(state, policies, rng=random, log=None):
+	# policies[player](state, player, rng) returns an action tuple for that seat.
+	# log, a handlog.HandLog, records the hand from the deal in state to the end
+	if log is not None:
+		log.deal(state)
+	while not state.hand_over:
+		if state.actions_taken >= MAX_ACTIONS_PER_HAND:
+			raise RuntimeError(f"hand did not finish after {MAX_ACTIONS_PER_HAND} actions: {state.bet_history}")
+		player = state.to_act
+		action = policies[player](state, player, rng)
+		apply_action(state, action)
+		if log is not None:
+			log.action(state, action)
+	if log is not None:
+		log.end(state)
+	return state
+
+def run_hands(variant, n_hands, policies, seed=None):
+	# headless batch runner, returns the final state, winner counts and the player's net chips.
+	# Cards come DEAL_CHUNK hands at a time from dealer.deal_variant instead of a 52-card shuffle
+	# per hand, which had been the biggest cost. The rest is the per-action path in python: on one
+	# core threehand plays 100-200k hands/s with random or calling bots, holdem and switch (about
+	# 12 actions a hand, and holdem's 7-card showdowns) 40-100k, and the strategy bot about 35k.
+	# Hundreds of thousands a second for those takes simulate.py's process pool
+	from dealer import deal_variant, generator  # dealer imports engine
+	rng = random.Random(seed)
+	cards = generator(seed)
+	state = new_game(variant)
+	results = {"player": 0, "bot": 0, "tie": 0}
+	net = 0
+	for chunk_start in range(0, n_hands, DEAL_CHUNK):
+		decks = deal_variant(variant, min(DEAL_CHUNK, n_hands - chunk_start), cards)
+		size = decks.shape[1]
+		decks = decks.tobytes()
+		for offset in range(0, len(decks), size):
+			top_up(deal(state, rng, decks[offset:offset + size]))
+			start = state.player_stacks
+			play_hand(state, policies, rng)
+			results[state.winner] += 1
+			net += state.player_stacks - start
+	return state, results, net
@@ -0,0 +1,178 @@
+import math
+import sys
+import time
+from itertools import chain, combinations
+from multiprocessing import Pool
+import numpy as np
+from cards import card_ids, id_cards, ranks, suits
+from evaluator import evaluate_seven_batch
+
+# hold'em equity of the player's hole cards against a known or random hand on a partial board.
+# small spots are enumerated exactly, bigger ones are sampled in numpy batches until the
+# standard error of the equity drops under the target
+EXACT_LIMIT = 50000  # runouts enumerated before switching to Monte Carlo
+BATCH = 8192
+TARGET_STDERR = 0.005
+MAX_SAMPLES = 2000000
+rank_letters = dict(zip('23456789TJQKA', ranks))
+suit_letters = {suit[0]: suit for suit in suits}
+comb_table = np.array([[math.comb(n, k) for k in range(8)] for n in range(52)], dtype=np.int64)
+
+
+def parse_cards(text):
+	# "As Td 9c" -> [('ace', 'spades'), ('10', 'diamonds'), ('9', 'clubs')], "10" works for tens too
+	cards = []
+	for token in text.replace(',', ' ').split():
+		rank, suit = token[:-1].upper(), token[-1].lower()
+		cards.append((rank_letters['T' if rank == '10' else rank], suit_letters[suit]))
+	return cards
+
+def to_ids(cards):
+	return [card if isinstance(card, (int, np.integer)) else card_ids[card] for card in cards]
+
+def tally(hero, villain):
+	# hero and villain are strength arrays, returns win and tie counts
+	return int((hero > villain).sum()), int((hero == villain).sum())
+
+def result(wins, ties, samples, exact):
+	win = wins / samples
+	tie = ties / samples
+	equity = win + tie / 2
+	# per-sample equity is 1, 1/2 or 0, so its variance is E[x^2] - equity^2
+	variance = max(win + tie / 4 - equity * equity, 0.0)
+	return {
+		'win': win,
+		'tie': tie,
+		'lose': 1 - win - tie,
+		'equity': equity,
+		'samples': samples,
+		'exact': exact,
+		'stderr': 0.0 if exact else math.sqrt(variance / samples),
+	}
+
+def subsets(n, k):
+	# every k-subset of range(n) as rows of an array, in itertools.combinations order
+	return np.fromiter(chain.from_iterable(combinations(range(n), k)), dtype=np.int64, count=math.comb(n, k) * k).reshape(math.comb(n, k), k)
+
+def colex_ranks(rows):
+	# where every sorted row of positions comes among all subsets of its size in colexicographic order
+	ranks = np.zeros(len(rows), dtype=np.int64)
+	for i in range(rows.shape[1]):
+		ranks += comb_table[rows[:, i], i + 1]
+	return ranks
+
+def enumerate_spot(hero, villain, board, remaining):
+	need = 5 - len(board)
+	cards = np.array(remaining, dtype=np.int64)
+	runouts = subsets(len(remaining), need)  # positions in remaining
+	fixed = np.array(board, dtype=np.int64)
+	boards = np.hstack([np.broadcast_to(fixed, (len(runouts), len(board))), cards[runouts]])
+	hero_strength = evaluate_seven_batch(np.hstack([np.broadcast_to(np.array(hero), (len(boards), 2)), boards]))
+	if villain:
+		villain_strength = evaluate_seven_batch(np.hstack([np.broadcast_to(np.array(villain), (len(boards), 2)), boards]))
+		return tally(hero_strength, villain_strength) + (len(boards),)
+	# every villain hand from the remaining cards against every runout it does not collide with.
+	# Together they are need + 2 of the remaining cards and the villain's hand only depends on
+	# which, so each such set is evaluated once and met by the runouts that can be picked out
+	# of it (three per set on the turn instead of 45 runouts times 990 villain hands)
+	unknown = subsets(len(remaining), need + 2)
+	villain_strength = evaluate_seven_batch(np.hstack([np.broadcast_to(fixed, (len(unknown), len(board))), cards[unknown]]))
+	hero_by_rank = np.empty_like(hero_strength)
+	hero_by_rank[colex_ranks(runouts)] = hero_strength
+	wins = ties = 0
+	for held in combinations(range(need + 2), need):
+		w, t = tally(hero_by_rank[colex_ranks(unknown[:, list(held)])], villain_strength)
+		wins += w
+		ties += t
+	return wins, ties, len(unknown) * math.comb(need + 2, need)
+
+def sample_spot(hero, villain, board, remaining, n, rng):
+	# n random runouts (plus villain hands), drawn without replacement from the remaining cards
+	need = 5 - len(board) + (0 if villain else 2)
+	remaining = np.array(remaining, dtype=np.int64)
+	draws = remaining[np.argpartition(rng.random((n, len(remaining))), need, axis=1)[:, :need]]
+	fixed = np.broadcast_to(np.array(board, dtype=np.int64), (n, len(board)))
+	if villain:
+		boards = np.hstack([fixed, draws])
+		villain_cards = np.broadcast_to(np.array(villain), (n, 2))
+	else:
+		boards = np.hstack([fixed, draws[:, 2:]])
+		villain_cards = draws[:, :2]
+	hero_strength = evaluate_seven_batch(np.hstack([np.broadcast_to(np.array(hero), (n, 2)), boards]))
+	villain_strength = evaluate_seven_batch(np.hstack([villain_cards, boards]))
+	return tally(hero_strength, villain_strength)
+
+def sample_worker(args):
+	hero, villain, board, remaining, n, seed = args
+	rng = np.random.default_rng(seed)
+	wins = ties = 0
+	for start in range(0, n, BATCH):
+		w, t = sample_spot(hero, villain, board, remaining, min(BATCH, n - start), rng)
+		wins += w
+		ties += t
+	return wins, ties, n
+
+def spot_size(villain, board, remaining):
+	size = math.comb(len(remaining), 5 - len(board))
+	if not villain:
+		size *= math.comb(len(remaining) - 5 + len(board), 2)
+	return size
+
+def equity(hero, villain=None, board=(), target_stderr=TARGET_STDERR, max_samples=MAX_SAMPLES, exact=None, workers=None, seed=None):
+	# hero and villain are two cards each, (rank, suit) tuples or card ids, villain None means a random hand.
+	# exact=None enumerates when the spot has at most EXACT_LIMIT runouts
+	hero, board = to_ids(hero), to_ids(board)
+	villain = to_ids(villain) if villain else None
+	known = hero + board + (villain or [])
+	if len(hero) != 2 or (villain and len(villain) != 2) or len(board) > 5 or len(set(known)) != len(known):
+		raise ValueError(f"bad spot: hero {hero}, villain {villain}, board {board}")
+	remaining = [card for card in range(52) if card not in known]
+	if exact is None:
+		exact = spot_size(villain, board, remaining) <= EXACT_LIMIT
+	if exact:
+		wins, ties, samples = enumerate_spot(hero, villain, board, remaining)
+		return result(wins, ties, samples, True)
+
+	seeds = np.random.SeedSequence(seed)
+	if workers and workers > 1:
+		# heavy spots: rounds of up to a batch per process, each from its own seed stream, merged
+		# after every round and stopped like the loop below
+		wins = ties = samples = 0
+		with Pool(workers) as pool:
+			while samples < max_samples:
+				per_worker = min(BATCH, math.ceil((max_samples - samples) / workers))
+				args = [(hero, villain, board, remaining, per_worker, child) for child in seeds.spawn(workers)]
+				for w, t, n in pool.map(sample_worker, args):
+					wins += w
+					ties += t
+					samples += n
+				if result(wins, ties, samples, False)['stderr'] <= target_stderr:
+					break
+		return result(wins, ties, samples, False)
+	rng = np.random.default_rng(seeds)
+	wins = ties = samples = 0
+	while samples < max_samples:
+		w, t = sample_spot(hero, villain, board, remaining, min(BATCH, max_samples - samples), rng)
+		wins += w
+		ties += t
+		samples += min(BATCH, max_samples - samples)
+		if result(wins, ties, samples, False)['stderr'] <= target_stderr:
+			break
+	return result(wins, ties, samples, False)
+
+def player_equity(state, player=0, **kwargs):
+	# equity of a seat in a poker.py GameState against a random hand, on the cards dealt so far
+	shown = {0: 0, 1: 3, 2: 4, 3: 5}.get(state.round_stage, 5)
+	return equity(state.hands[player], None, state.community_cards[:shown], **kwargs)
+
+
+if __name__ == '__main__':
+	# python equity.py "As Kd" ["Qh Qc"] ["Jh Ts 2c"]
+	hero = parse_cards(sys.argv[1])
+	villain = parse_cards(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].strip() else None
+	board = parse_cards(sys.argv[3]) if len(sys.argv) > 3 else []
+	start = time.perf_counter()
+	spot = equity(hero, villain, board)
+	elapsed = time.perf_counter() - start
+	print(f"{[id_cards[c] for c in to_ids(hero)]} vs {villain or 'random'} on {board}")
+	print(f"equity {spot['equity']:.4f} (win {spot['win']:.4f}, tie {spot['tie']:.4f}), {'exact' if spot['exact'] else 'stderr %.4f' % spot['stderr']}, {spot['samples']} runouts in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,277 @@
+import itertools
+from array import array
+import numpy as np
+from cards import card_ids, card_suit, card_value
+
+# strengths are single ints that order exactly like the (category, values) tuples
+# returned by evaluate_hand, with the category on top and one 4-bit nibble per value
+# triples carry one value and pairs two, the missing nibbles are zero
+THREE_VALUE_COUNTS = [3, 2, 3, 3, 1, 3]
+
+
+def pack_three(category, values):
+	strength = category
+	for i in range(3):
+		strength = (strength << 4) | (values[i] if i < len(values) else 0)
+	return strength
+
+def unpack_three(strength):
+	category = strength >> 12
+	values = [(strength >> 8) & 15, (strength >> 4) & 15, strength & 15]
+	return (category, values[:THREE_VALUE_COUNTS[category]])
+
+def three_card_category(v0, v1, v2, flush):
+	# the rules of 3handpoker.py's evaluate_hand, on values sorted high to low
+	straight = v0 - 1 == v1 and v1 - 1 == v2
+	if straight and flush:
+		return (5, [v0, v1, v2])
+	elif v0 == v2:
+		return (4, [v0])
+	elif straight:
+		return (3, [v0, v1, v2])
+	elif flush:
+		return (2, [v0, v1, v2])
+	elif v0 == v1:
+		return (1, [v0, v2])
+	elif v1 == v2:
+		return (1, [v1, v0])
+	else:
+		return (0, [v0, v1, v2])
+
+def build_three_table():
+	# direct index on c0 * 2704 + c1 * 52 + c2 for every ordering of the three card ids
+	table = array('H', bytes(2 * 52 ** 3))
+	for a, b, c in itertools.combinations(range(52), 3):
+		# ids grow with rank, so c holds the highest value
+		flush = card_suit(a) == card_suit(b) == card_suit(c)
+		strength = pack_three(*three_card_category(card_value(c), card_value(b), card_value(a), flush))
+		table[a * 2704 + b * 52 + c] = strength
+		table[a * 2704 + c * 52 + b] = strength
+		table[b * 2704 + a * 52 + c] = strength
+		table[b * 2704 + c * 52 + a] = strength
+		table[c * 2704 + a * 52 + b] = strength
+		table[c * 2704 + b * 52 + a] = strength
+	return table
+
+THREE_TABLE = build_three_table()
+
+
+def three_card_strength_ids(a, b, c):
+	return THREE_TABLE[a * 2704 + b * 52 + c]
+
+def three_card_strength(hand):
+	# hand is three (rank, suit) tuples
+	return THREE_TABLE[card_ids[hand[0]] * 2704 + card_ids[hand[1]] * 52 + card_ids[hand[2]]]
+
+
+# hold'em strengths follow poker.py's 5-card evaluate_hand, best hand out of 5 to 7 cards
+FIVE_VALUE_COUNTS = [5, 4, 3, 3, 5, 5, 2, 2, 5]
+
+
+def pack_five(category, values):
+	strength = category
+	for i in range(5):
+		strength = (strength << 4) | (values[i] if i < len(values) else 0)
+	return strength
+
+def unpack_five(strength):
+	category = strength >> 20
+	values = [(strength >> shift) & 15 for shift in (16, 12, 8, 4, 0)]
+	return (category, values[:FIVE_VALUE_COUNTS[category]])
+
+def mask_values(mask, count):
+	# the highest count values in a 13-bit rank mask
+	values = []
+	for rank in range(12, -1, -1):
+		if mask >> rank & 1:
+			values.append(rank + 2)
+			if len(values) == count:
+				break
+	return values
+
+def build_straight_table():
+	# value of the top card of the highest five-rank run in a rank mask, 0 if none (no wheel, as in poker.py)
+	table = array('B', bytes(8192))
+	for mask in range(8192):
+		for top in range(12, 3, -1):
+			if mask >> (top - 4) & 31 == 31:
+				table[mask] = top + 2
+				break
+	return table
+
+STRAIGHT_TABLE = build_straight_table()
+
+
+def build_flush_table():
+	# strength of the best hand in a single suit's rank mask once it holds five or more cards
+	table = array('I', bytes(4 * 8192))
+	for mask in range(8192):
+		if bin(mask).count('1') < 5:
+			continue
+		top = STRAIGHT_TABLE[mask]
+		if top:
+			table[mask] = pack_five(8, list(range(top, top - 5, -1)))
+		else:
+			table[mask] = pack_five(5, mask_values(mask, 5))
+	return table
+
+FLUSH_TABLE = build_flush_table()
+
+# rank keys hold one 3-bit count per rank, strengths of unsuited hands are cached per key
+rank_strengths = {}
+
+
+def rank_key_strength(key):
+	counts = [(key >> (3 * rank)) & 7 for rank in range(13)]
+	by_count = [[], [], [], [], []]
+	mask = 0
+	for rank in range(12, -1, -1):
+		if counts[rank]:
+			by_count[counts[rank]].append(rank + 2)
+			mask |= 1 << rank
+	quads, trips, pairs, singles = by_count[4], by_count[3], by_count[2], by_count[1]
+	if quads:
+		kicker = max(trips[:1] + pairs[:1] + singles[:1] + quads[1:2])
+		strength = pack_five(7, [quads[0], kicker])
+	elif trips and (len(trips) > 1 or pairs):
+		strength = pack_five(6, [trips[0], max(trips[1:2] + pairs[:1])])
+	elif STRAIGHT_TABLE[mask]:
+		top = STRAIGHT_TABLE[mask]
+		strength = pack_five(4, list(range(top, top - 5, -1)))
+	elif trips:
+		strength = pack_five(3, [trips[0]] + singles[:2])
+	elif len(pairs) > 1:
+		strength = pack_five(2, pairs[:2] + [max(pairs[2:3] + singles[:1])])
+	elif pairs:
+		strength = pack_five(1, pairs[:1] + singles[:3])
+	else:
+		strength = pack_five(0, singles[:5])
+	rank_strengths[key] = strength
+	return strength
+
+def seven_card_strength_ids(ids):
+	key = 0
+	suit_masks = [0, 0, 0, 0]
+	suit_counts = [0, 0, 0, 0]
+	for card in ids:
+		rank = card >> 2
+		suit = card & 3
+		key += 1 << (3 * rank)
+		suit_masks[suit] |= 1 << rank
+		suit_counts[suit] += 1
+	# with at most 7 cards a flush rules out quads and full houses, so it is the best hand
+	for suit in range(4):
+		if suit_counts[suit] >= 5:
+			return FLUSH_TABLE[suit_masks[suit]]
+	strength = rank_strengths.get(key)
+	if strength is None:
+		strength = rank_key_strength(key)
+	return strength
+
+def seven_card_strength(cards):
+	# cards are 5 to 7 (rank, suit) tuples, usually hole cards + community_cards
+	return seven_card_strength_ids([card_ids[card] for card in cards])
+
+
+def build_top_ranks():
+	# top_ranks[k][mask]: the rank mask cut down to its k highest ranks
+	masks = np.arange(8192, dtype=np.int64)
+	counts = np.zeros(8192, dtype=np.int64)
+	for rank in range(13):
+		counts += (masks >> rank) & 1
+	table = np.empty((6, 8192), dtype=np.int64)
+	for k in range(6):
+		top = masks.copy()
+		left = counts.copy()
+		for _ in range(13):
+			over = left > k
+			top = np.where(over, top & (top - 1), top)
+			left -= over
+		table[k] = top
+	return table
+
+def build_value_nibbles():
+	# the values of a rank mask of up to five ranks, high to low, in the value nibbles of a pack_five strength
+	masks = np.arange(8192, dtype=np.int64)
+	table = np.zeros(8192, dtype=np.int64)
+	shift = np.full(8192, 16, dtype=np.int64)
+	for rank in range(12, -1, -1):
+		held = (((masks >> rank) & 1) == 1) & (shift >= 0)
+		table[held] |= np.int64(rank + 2) << shift[held]
+		shift -= 4 * held
+	return table
+
+# per card id: one byte per suit for counting suits, and its rank bit
+suit_keys_np = np.int64(1) << (8 * (np.arange(52) & 3))
+rank_bits_np = np.int64(1) << (np.arange(52) >> 2)
+three_table_np = np.frombuffer(THREE_TABLE, dtype=np.uint16)
+flush_table_np = np.frombuffer(FLUSH_TABLE, dtype=np.uint32).astype(np.int64)
+straight_strengths_np = np.array([pack_five(4, list(range(top, top - 5, -1))) if top else 0 for top in STRAIGHT_TABLE], dtype=np.int64)
+top_ranks_np = build_top_ranks()
+value_nibbles_np = build_value_nibbles()
+
+
+def evaluate_three_batch(cards):
+	return three_table_np[cards[:, 0] * 2704 + cards[:, 1] * 52 + cards[:, 2]].astype(np.int64)
+
+def evaluate_seven_batch(cards):
+	# masks of the ranks held at least once, twice, three and four times plus suit counts, added
+	# up card by card one column at a time, then every category is read off the masks through
+	# 8192-entry tables and the best one that applies is kept, the same rules as rank_key_strength
+	columns = np.ascontiguousarray(cards.T)
+	ones = np.zeros(len(cards), dtype=np.int64)
+	twos = np.zeros(len(cards), dtype=np.int64)
+	threes = np.zeros(len(cards), dtype=np.int64)
+	fours = np.zeros(len(cards), dtype=np.int64)
+	suit_counts = np.zeros(len(cards), dtype=np.int64)
+	for column in columns:
+		bit = rank_bits_np[column]
+		fours |= threes & bit
+		threes |= twos & bit
+		twos |= ones & bit
+		ones |= bit
+		suit_counts += suit_keys_np[column]
+
+	top1, top2, top3, top5 = top_ranks_np[1], top_ranks_np[2], top_ranks_np[3], top_ranks_np[5]
+	nibbles = value_nibbles_np
+	trips = top1[threes]
+	pairs = top2[twos]
+	straights = straight_strengths_np[ones]
+	strength = np.select([
+		fours != 0,
+		(threes != 0) & ((twos & ~trips) != 0),
+		straights != 0,
+		threes != 0,
+		(twos & (twos - 1)) != 0,
+		twos != 0,
+	], [
+		(7 << 20) | nibbles[fours] | (nibbles[top1[ones & ~fours]] >> 4),
+		(6 << 20) | nibbles[trips] | (nibbles[top1[twos & ~trips]] >> 4),
+		straights,
+		(3 << 20) | nibbles[trips] | (nibbles[top2[ones & ~threes]] >> 4),
+		(2 << 20) | nibbles[pairs] | (nibbles[top1[ones & ~pairs]] >> 8),
+		(1 << 20) | nibbles[twos] | (nibbles[top3[ones & ~twos]] >> 4),
+	], nibbles[top5[ones]])
+
+	# with at most 7 cards a flush beats anything the ranks alone can make, and only one suit
+	# can hold five: adding 3 to every suit byte sets its bit 3 exactly when the count is 5 or more
+	flush_bits = (suit_counts + 0x03030303) & 0x08080808
+	flushes = np.nonzero(flush_bits)[0]
+	if len(flushes):
+		flush_bits = flush_bits[flushes]
+		flush_suit = (flush_bits >= 0x800).astype(np.int64) + (flush_bits >= 0x80000) + (flush_bits >= 0x8000000)
+		flush_cards = cards[flushes]
+		mask = (rank_bits_np[flush_cards] * ((flush_cards & 3) == flush_suit[:, None])).sum(axis=1)
+		strength[flushes] = flush_table_np[mask]
+	return strength
+
+def evaluate_hand_batch(cards):
+	# cards is an (N, k) array of card ids, k = 3 for the 3-card games and 5 to 7 for hold'em
+	cards = np.asarray(cards, dtype=np.int64)
+	if cards.ndim != 2:
+		raise ValueError(f"expected an (N, k) array of card ids, got shape {cards.shape}")
+	if cards.shape[1] == 3:
+		return evaluate_three_batch(cards)
+	if 5 <= cards.shape[1] <= 7:
+		return evaluate_seven_batch(cards)
+	raise ValueError(f"no evaluator for {cards.shape[1]}-card hands")
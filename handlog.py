@@ -0,0 +1,207 @@
+import atexit
+import os
+import struct
+import sys
+import numpy as np
+import engine
+from cards import id_cards
+
+# append-only binary hand histories. A file is an 8-byte header and then 16-byte records, so a
+# log can be read as a stream or mapped straight into an (n, 16) array. A hand is
+#   DEAL    variant, player_is_bb, the first 11 cards of the deck
+#   START   pot and both stacks as dealt
+#   ACTION  one per move (switch selections included): seat, action, bet amount (as applied for
+#           bets and raises), pot after it
+#   END     winner, showdown flag, pot and both stacks after the hand
+# chips are float32, exact for anything these games produce below 2**24. Records of a hand are
+# held back until its END, so hands from several tables never interleave, then written in
+# batches of about BUFFER_SIZE bytes. A hand still running when the log closes is dropped
+MAGIC = b'PKHL'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')  # magic, version, record size
+RECORD_SIZE = 16
+BUFFER_SIZE = 1 << 20
+DEAL, START, ACTION, END = 1, 2, 3, 4
+DECK_CARDS = 11  # enough for every variant's hands and board
+NO_CARD = 255
+UNKNOWN_ACTION = 127  # an action name outside engine.ACTIONS, replayed as ""
+VARIANTS = sorted(engine.VARIANTS)
+variant_codes = {variant: code for code, variant in enumerate(VARIANTS)}
+WINNERS = ["player", "bot", "tie", None]  # None: hand abandoned at MAX_ACTIONS_PER_HAND
+winner_codes = {winner: code for code, winner in enumerate(WINNERS)}
+SHOWDOWN = 4  # END flag bit next to the winner code
+
+DEAL_RECORD = struct.Struct('<BBB11sxx')  # type, variant, player_is_bb, cards
+CHIPS_RECORD = struct.Struct('<BBxxfff')  # type, END: winner | SHOWDOWN, pot, player stack, bot stack
+ACTION_RECORD = struct.Struct('<BBxxfd')  # type, player << 7 | action code, pot after, bet amount in BB
+
+# numpy views of the same layouts, for reading a mapped log without unpacking record by record
+DEAL_DTYPE = np.dtype([('type', 'u1'), ('variant', 'u1'), ('player_is_bb', 'u1'), ('cards', 'u1', DECK_CARDS), ('pad', 'V2')])
+CHIPS_DTYPE = np.dtype([('type', 'u1'), ('flags', 'u1'), ('pad', 'V2'), ('pot', '<f4'), ('player_stacks', '<f4'), ('bot_stacks', '<f4')])
+ACTION_DTYPE = np.dtype([('type', 'u1'), ('move', 'u1'), ('pad', 'V2'), ('pot', '<f4'), ('amount', '<f8')])
+
+
+def deal_record(state):
+	cards = bytes(state.deck[:DECK_CARDS])
+	return DEAL_RECORD.pack(DEAL, variant_codes[state.variant], state.player_is_bb, cards + bytes([NO_CARD] * (DECK_CARDS - len(cards))))
+
+def action_record(state, action):
+	# bets and raises go in at the size the engine applied, which threehand caps
+	player, name, bet_amount = action
+	if (name == "BET" or name == "RAISE") and state.bet_history:
+		bet_amount = state.bet_history.last()
+	return ACTION_RECORD.pack(ACTION, player << 7 | engine.action_codes.get(name, UNKNOWN_ACTION), state.pot_size, bet_amount)
+
+def end_record(state):
+	flags = winner_codes[state.winner] | (SHOWDOWN if state.show_cards else 0)
+	return CHIPS_RECORD.pack(END, flags, state.pot_size, state.player_stacks, state.bot_stacks)
+
+
+class HandLog:
+
+	def __init__(self, path, buffer_size=BUFFER_SIZE):
+		self.path = path
+		self.file = open(path, 'ab')
+		if self.file.tell() == 0:
+			self.file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE))
+		self.buffer = bytearray()
+		self.buffer_size = buffer_size
+		self.open_hands = {}  # key (a table) -> records of its hand in progress
+		self.hands = 0
+
+	def deal(self, state, key=0):
+		# call right after the deal, before any action
+		self.open_hands[key] = bytearray(deal_record(state) + CHIPS_RECORD.pack(START, 0, state.pot_size, state.player_stacks, state.bot_stacks))
+
+	def action(self, state, action, key=0):
+		# state is the one after the action
+		hand = self.open_hands.get(key)
+		if hand is not None:
+			hand += action_record(state, action)
+
+	def end(self, state, key=0):
+		hand = self.open_hands.pop(key, None)
+		if hand is None:
+			return
+		hand += end_record(state)
+		self.buffer += hand
+		self.hands += 1
+		if len(self.buffer) >= self.buffer_size:
+			self.flush()
+
+	def discard(self, key=0):
+		# a hand that will never finish, e.g. its table closed mid-hand
+		self.open_hands.pop(key, None)
+
+	def step(self, previous, action, state, key=0):
+		# for the front ends' handle_action: log the move, and the end of the hand if it ended
+		self.action(state, action, key)
+		if state.hand_over and not previous.hand_over:
+			self.end(state, key)
+
+	def flush(self):
+		if self.buffer:
+			self.file.write(self.buffer)
+			self.buffer = bytearray()
+		self.file.flush()
+
+	def close(self):
+		if not self.file.closed:
+			self.flush()
+			self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def open_from_env(environ=os.environ):
+	# the front ends log when POKER_HANDLOG names a file
+	path = environ.get('POKER_HANDLOG')
+	if not path:
+		return None
+	log = HandLog(path)
+	atexit.register(log.close)
+	return log
+
+
+def check_header(data, path):
+	if len(data) < HEADER.size:
+		raise ValueError(f"{path}: too short for a hand log")
+	magic, version, record_size = HEADER.unpack_from(data)
+	if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+		raise ValueError(f"{path}: not a version {VERSION} hand log")
+
+def load_records(path):
+	# the whole log as a read-only (n, 16) uint8 memmap, without a torn record at the tail of a live log
+	with open(path, 'rb') as f:
+		check_header(f.read(HEADER.size), path)
+	size = os.path.getsize(path) - HEADER.size
+	if size < RECORD_SIZE:
+		return np.zeros((0, RECORD_SIZE), dtype=np.uint8)
+	return np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.size, shape=(size // RECORD_SIZE, RECORD_SIZE))
+
+def iter_hands(path, chunk_records=1 << 16):
+	# finished hands as dicts: variant, player_is_bb, deck, start (pot, player, bot),
+	# actions [((player, name, amount), pot after)], winner, showdown, end (pot, player, bot).
+	# The log is read a chunk of records at a time, each field turned into a list in one numpy
+	# call: bytes 1 and 2, the float32 at 4 (pot in START, ACTION and END), the two float32 after
+	# it (stacks) and the float64 after it (bet amount), each meaningful for some record types
+	records = load_records(path)
+	hand = None
+	for chunk_start in range(0, len(records), chunk_records):
+		chunk = np.ascontiguousarray(records[chunk_start:chunk_start + chunk_records])
+		chips = chunk.view(CHIPS_DTYPE).ravel()
+		types = chunk[:, 0].tolist()
+		first = chunk[:, 1].tolist()
+		second = chunk[:, 2].tolist()
+		pots = chips['pot'].tolist()
+		player_stacks = chips['player_stacks'].tolist()
+		bot_stacks = chips['bot_stacks'].tolist()
+		amounts = chunk.view(ACTION_DTYPE).ravel()['amount'].tolist()
+		for i, kind in enumerate(types):
+			if kind == DEAL:
+				cards = bytes(chunk[i, 3:3 + DECK_CARDS])
+				hand = {'variant': VARIANTS[first[i]], 'player_is_bb': bool(second[i]), 'deck': list(cards.rstrip(bytes([NO_CARD]))), 'actions': []}
+			elif hand is None:
+				continue  # the tail of a hand whose DEAL came before this file starts
+			elif kind == ACTION:
+				move = first[i]
+				code = move & 0x7f
+				amount = amounts[i]
+				hand['actions'].append(((move >> 7, engine.ACTIONS[code] if code < len(engine.ACTIONS) else "", int(amount) if amount.is_integer() else amount), pots[i]))
+			elif kind == START:
+				hand['start'] = (pots[i], player_stacks[i], bot_stacks[i])
+			elif kind == END:
+				flags = first[i]
+				hand['winner'], hand['showdown'], hand['end'] = WINNERS[flags & 3], bool(flags & SHOWDOWN), (pots[i], player_stacks[i], bot_stacks[i])
+				yield hand
+				hand = None
+			else:
+				raise ValueError(f"{path}: unknown record type {kind}")
+
+def concat_logs(parts, path):
+	# appends the records of the part logs to path in order, then deletes them
+	with HandLog(path) as log:
+		log.flush()
+		for part in parts:
+			with open(part, 'rb') as f:
+				check_header(f.read(HEADER.size), part)
+				while True:
+					chunk = f.read(BUFFER_SIZE)
+					if not chunk:
+						break
+					log.file.write(chunk)
+			os.remove(part)
+
+
+if __name__ == '__main__':
+	# python handlog.py hands.log prints the hands
+	for hand in iter_hands(sys.argv[1]):
+		cards = ' '.join(f"{rank if rank.isdigit() else rank[0].upper()}{suit[0]}" for rank, suit in (id_cards[card] for card in hand['deck']))
+		print(f"{hand['variant']} bb={'player' if hand['player_is_bb'] else 'bot'} [{cards}] stacks {hand['start'][1]:g}/{hand['start'][2]:g}")
+		for (player, name, amount), pot in hand['actions']:
+			print(f"  {player}: {name} {amount:g} (pot {pot:g})")
+		print(f"  {hand['winner']}{' at showdown' if hand['showdown'] else ''}, stacks {hand['end'][1]:g}/{hand['end'][2]:g}")
@@ -0,0 +1,67 @@
+# an infoset code packs the bot's hand bucket and its bet deltas into one int:
+# bucket (4 bits) | number of deltas (3 bits) | up to MAX_DELTAS deltas of DELTA_BITS each
+BUCKETS = [
+	'lowest card', 'lower card', 'higher card', 'highest card',
+	'lowest pair', 'lower pair', 'higher pair', 'highest pair',
+	'low flush', 'high flush',
+	'low straight', 'high straight',
+	'low triple', 'high triple',
+	'straight flush',
+]
+bucket_ids = {name: i for i, name in enumerate(BUCKETS)}
+
+BUCKET_BITS = 4
+LENGTH_BITS = 3
+DELTA_BITS = 5
+MAX_DELTAS = 4
+DELTA_MASK = (1 << DELTA_BITS) - 1
+DELTAS_BITS = DELTA_BITS * MAX_DELTAS
+INFOSET_BITS = BUCKET_BITS + LENGTH_BITS + DELTAS_BITS
+
+
+def classify_value(value):
+	return "low" if value <= 8 else "high"
+
+def classify_spec_value(value):
+	return "lowest" if value <= 4 else "lower" if value <= 7 else "higher" if value <= 10 else "highest"
+
+def hand_bucket(category, top_value):
+	# category and top_value are evaluate_hand(hand)[0] and evaluate_hand(hand)[1][0]
+	if category == 0:
+		return bucket_ids[classify_spec_value(top_value) + " card"]
+	elif category == 1:
+		return bucket_ids[classify_spec_value(top_value) + " pair"]
+	elif category == 2:
+		return bucket_ids[classify_value(top_value) + " flush"]
+	elif category == 3:
+		return bucket_ids[classify_value(top_value) + " straight"]
+	elif category == 4:
+		return bucket_ids[classify_value(top_value) + " triple"]
+	return bucket_ids["straight flush"]
+
+def encode_infoset(bucket, deltas):
+	if len(deltas) > MAX_DELTAS:
+		raise ValueError(f"too many bet deltas: {deltas}")
+	packed = 0
+	for i, delta in enumerate(deltas):
+		delta = int(delta)
+		if delta < 0 or delta > DELTA_MASK:
+			raise ValueError(f"bet delta out of range: {deltas}")
+		packed |= delta << (DELTA_BITS * (MAX_DELTAS - 1 - i))
+	return (bucket << (LENGTH_BITS + DELTAS_BITS)) | (len(deltas) << DELTAS_BITS) | packed
+
+def decode_infoset(code):
+	bucket = code >> (LENGTH_BITS + DELTAS_BITS)
+	length = (code >> DELTAS_BITS) & ((1 << LENGTH_BITS) - 1)
+	deltas = [(code >> (DELTA_BITS * (MAX_DELTAS - 1 - i))) & DELTA_MASK for i in range(length)]
+	return bucket, deltas
+
+def key_to_code(key):
+	# "high flush[0, 1, 10]" -> code
+	split = key.index('[')
+	deltas = [int(delta) for delta in key[split + 1:-1].split(',') if delta.strip()]
+	return encode_infoset(bucket_ids[key[:split]], deltas)
+
+def code_to_key(code):
+	bucket, deltas = decode_infoset(code)
+	return BUCKETS[bucket] + str(deltas)
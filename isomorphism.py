@@ -0,0 +1,93 @@
+from itertools import combinations, permutations
+from math import factorial
+import numpy as np
+from cards import card_ids
+
+# the rules never look at which suit is which, only at whether suits match, so hands that differ
+# by a relabeling of suits play the same. A spot is a tuple of card groups (hand, or hole cards
+# and board), order inside a group does not matter. Suits are relabeled by sorting them on their
+# rank masks group by group, highest first, which gives every isomorphic spot the same cards.
+# weights are the number of raw spots a class stands for, 24 / (permutations that fix it)
+SUIT_PERMUTATIONS = list(permutations(range(4)))
+
+
+def to_ids(cards):
+	return [card if isinstance(card, (int, np.integer)) else card_ids[card] for card in cards]
+
+def suit_signatures(groups):
+	signatures = [[0] * len(groups) for _ in range(4)]
+	for g, group in enumerate(groups):
+		for card in group:
+			signatures[card & 3][g] |= 1 << (card >> 2)
+	return signatures
+
+def canonical(*groups):
+	# groups of card ids or (rank, suit) tuples -> tuple of sorted card id tuples
+	groups = [to_ids(group) for group in groups]
+	signatures = suit_signatures(groups)
+	order = sorted(range(4), key=signatures.__getitem__, reverse=True)
+	relabel = [0] * 4
+	for new, old in enumerate(order):
+		relabel[old] = new
+	return tuple(tuple(sorted((card & ~3) | relabel[card & 3] for card in group)) for group in groups)
+
+def weight(*groups):
+	# raw spots in the class: suits with identical signatures can be swapped without changing anything
+	signatures = suit_signatures([to_ids(group) for group in groups])
+	stabilizer = 1
+	for signature in set(map(tuple, signatures)):
+		stabilizer *= factorial(signatures.count(list(signature)))
+	return 24 // stabilizer
+
+def pack(groups):
+	# one int per canonical spot, 52 bits per group
+	key = 0
+	for g, group in enumerate(groups):
+		for card in group:
+			key |= 1 << (52 * g + card)
+	return key
+
+
+def build_classes(size):
+	# class of every size-card hand in combinations(range(52), size) order, the class
+	# representatives and the number of hands in each class, the same relabeling as canonical
+	hands = np.array(list(combinations(range(52), size)), dtype=np.int64)
+	suits = hands & 3
+	masks = np.zeros((len(hands), 4), dtype=np.int64)
+	for column in range(size):
+		np.add.at(masks, (np.arange(len(hands)), suits[:, column]), np.int64(1) << (hands[:, column] >> 2))
+	order = np.argsort(-masks, axis=1, kind='stable')
+	relabel = np.argsort(order, axis=1)
+	forms = np.sort((hands & ~3) | np.take_along_axis(relabel, suits, axis=1), axis=1)
+	keys = (np.int64(1) << forms).sum(axis=1)
+	_, first, hand_class, weights = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+	representatives = forms[first]
+	classes = {tuple(form): index for index, form in enumerate(representatives.tolist())}
+	return classes, hand_class.astype(np.int32), representatives, weights
+
+# 3-card hands: 22100 hands in 1755 classes, numbered like matchups.py
+THREE_CLASSES, THREE_CLASS, THREE_REPRESENTATIVES, THREE_WEIGHTS = build_classes(3)
+# hold'em hole cards: 1326 hands in 169 classes
+PREFLOP_CLASSES, PREFLOP_CLASS, PREFLOP_REPRESENTATIVES, PREFLOP_WEIGHTS = build_classes(2)
+
+
+def three_class(hand):
+	return THREE_CLASSES[canonical(hand)[0]]
+
+def preflop_class(hole):
+	return PREFLOP_CLASSES[canonical(hole)[0]]
+
+def holdem_key(hole, board=()):
+	# the same int for every suit relabeling of the hole cards and board, board order ignored
+	return pack(canonical(hole, board))
+
+def holdem_weight(hole, board=()):
+	return weight(hole, board)
+
+def expand(*groups):
+	# every distinct raw spot in the class of groups, the inverse of canonical
+	groups = [to_ids(group) for group in groups]
+	spots = set()
+	for perm in SUIT_PERMUTATIONS:
+		spots.add(tuple(tuple(sorted((card & ~3) | perm[card & 3] for card in group)) for group in groups))
+	return sorted(spots)
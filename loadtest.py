@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import random
+import time
+import numpy as np
+import engine
+from server import (ACTION, ACTION_MSG, ERROR, ERROR_MSG, FRAME, JOIN, JOIN_MSG, RESULT, RESULT_MSG,
+	STATE, STATE_MSG, VARIANTS, YOUR_TURN, frame)
+
+# python loadtest.py --tables 2000 --connections 20 --seconds 30
+# headless clients for server.py: every connection opens its share of the tables and answers
+# each STATE with a random legal betting action, sized like the front ends' buttons allow
+# (at least double the highest bet it has seen this hand, within its stack). Latency is the time from sending an action to
+# the server's next message for that table, which includes the bot's reply
+BETTING_ACTIONS = range(5)  # FOLD..RAISE, card switching is left alone
+BETS = (engine.action_codes["BET"], engine.action_codes["RAISE"])
+FOLD_WEIGHT = 0.1
+MIN_BET = 2
+
+
+def choose(mask, rng, can_bet=True):
+	legal = [code for code in BETTING_ACTIONS if mask >> code & 1 and (can_bet or code not in BETS)]
+	weights = [FOLD_WEIGHT if code == 0 else 1 for code in legal]
+	return rng.choices(legal, weights)[0]
+
+
+async def run_connection(host, port, variant, tables, deadline, stats, seed):
+	rng = random.Random(seed)
+	big_blind = engine.VARIANTS[variant]['big_blind']
+	highest = {}  # table -> highest bet seen this hand, in BB
+	reader, writer = await asyncio.open_connection(host, port)
+	sent = {}
+	for _ in range(tables):
+		writer.write(frame(JOIN_MSG.pack(JOIN, VARIANTS.index(variant))))
+	await writer.drain()
+	try:
+		while time.perf_counter() < deadline:
+			try:
+				header = await asyncio.wait_for(reader.readexactly(FRAME.size), deadline - time.perf_counter())
+			except asyncio.TimeoutError:
+				break
+			payload = await reader.readexactly(FRAME.unpack(header)[0])
+			kind = payload[0]
+			now = time.perf_counter()
+			if kind == STATE:
+				fields = STATE_MSG.unpack(payload)
+				table_id, flags, mask, player_stack = fields[1], fields[3], fields[4], fields[6]
+				if fields[8] in BETS:
+					highest[table_id] = max(highest.get(table_id, 1), fields[9])
+			elif kind == RESULT:
+				table_id = RESULT_MSG.unpack(payload)[1]
+				highest.pop(table_id, None)
+				stats['hands'] += 1
+			elif kind == ERROR:
+				table_id = ERROR_MSG.unpack(payload)[1]
+				stats['errors'] += 1
+				continue
+			else:
+				continue
+			start = sent.pop(table_id, None)
+			if start is not None:
+				stats['latencies'].append(now - start)
+			if kind == STATE and flags & YOUR_TURN:
+				amount = max(MIN_BET, 2 * highest.get(table_id, 1))
+				code = choose(mask, rng, amount * big_blind <= player_stack)
+				if code in BETS:
+					highest[table_id] = amount
+				writer.write(frame(ACTION_MSG.pack(ACTION, table_id, code, amount)))
+				sent[table_id] = time.perf_counter()
+				stats['actions'] += 1
+				if writer.transport.get_write_buffer_size() > 1 << 16:
+					await writer.drain()
+	finally:
+		writer.close()
+
+
+async def load_test(host, port, variant, tables, connections, seconds, seed):
+	stats = {'hands': 0, 'actions': 0, 'errors': 0, 'latencies': []}
+	start = time.perf_counter()
+	deadline = start + seconds
+	shares = [tables // connections + (i < tables % connections) for i in range(connections)]
+	await asyncio.gather(*(run_connection(host, port, variant, share, deadline, stats, seed * connections + i) for i, share in enumerate(shares) if share))
+	stats['elapsed'] = time.perf_counter() - start
+	return stats
+
+def summarize(stats):
+	latencies = np.array(stats['latencies']) * 1000
+	elapsed = stats['elapsed']
+	p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (float('nan'), float('nan'))
+	return {
+		'hands': stats['hands'],
+		'hands_per_second': stats['hands'] / elapsed,
+		'actions_per_second': stats['actions'] / elapsed,
+		'p50_ms': p50,
+		'p99_ms': p99,
+		'errors': stats['errors'],
+	}
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="load test for server.py")
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--variant', choices=VARIANTS, default='threehand')
+	parser.add_argument('--tables', type=int, default=1000)
+	parser.add_argument('--connections', type=int, default=10)
+	parser.add_argument('--seconds', type=float, default=10)
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args()
+	summary = summarize(asyncio.run(load_test(args.host, args.port, args.variant, args.tables, args.connections, args.seconds, args.seed)))
+	print(f"{summary['hands']} hands in {args.seconds:g}s on {args.tables} {args.variant} tables")
+	print(f"{summary['hands_per_second']:.0f} hands/s, {summary['actions_per_second']:.0f} actions/s")
+	print(f"latency p50 {summary['p50_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms, {summary['errors']} errors")
@@ -0,0 +1,194 @@
+import mmap
+import os
+import struct
+import sys
+import time
+from itertools import combinations
+import numpy as np
+from cards import card_ids
+from evaluator import three_table_np, unpack_three
+from infoset import BUCKETS, hand_bucket
+
+# head-to-head results of every 3-card hand against every other under 3handpoker.py's rules.
+# hands are numbered in combinations(range(52), 3) order. Each result takes 2 bits,
+# 0 where the hands share a card, 1 loss, 2 tie, 3 win, four to a byte, high bits first,
+# so a row is 5525 bytes and the whole matrix ~122 MB, read through a memory map.
+# layout: header, hand strengths, equity vs a random hand, hand buckets, bucket vs bucket equity, packed rows
+MAGIC = b'PKMX'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+HANDS = np.array(list(combinations(range(52), 3)), dtype=np.int64)
+N_HANDS = len(HANDS)
+ROW_BYTES = (N_HANDS + 3) // 4
+DEFAULT_PATH = 'threehand_matchups.bin'
+
+
+def build_hand_index():
+	# hand number of any ordering of three card ids, on the same c0 * 2704 + c1 * 52 + c2 index as THREE_TABLE
+	index = np.full(52 ** 3, -1, dtype=np.int32)
+	numbers = np.arange(N_HANDS, dtype=np.int32)
+	for a, b, c in ((0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0)):
+		index[HANDS[:, a] * 2704 + HANDS[:, b] * 52 + HANDS[:, c]] = numbers
+	return index
+
+HAND_INDEX = build_hand_index()
+STRENGTHS = three_table_np[HANDS[:, 0] * 2704 + HANDS[:, 1] * 52 + HANDS[:, 2]].astype(np.int64)
+HAND_MASKS = (np.int64(1) << HANDS).sum(axis=1)
+
+
+def build_hand_buckets():
+	buckets = np.empty(N_HANDS, dtype=np.int64)
+	for number, strength in enumerate(STRENGTHS.tolist()):
+		category, values = unpack_three(strength)
+		buckets[number] = hand_bucket(category, values[0])
+	return buckets
+
+HAND_BUCKETS = build_hand_buckets()
+
+
+def hand_number(hand):
+	# hand is three (rank, suit) tuples or three card ids
+	ids = [card if isinstance(card, (int, np.integer)) else card_ids[card] for card in hand]
+	return int(HAND_INDEX[ids[0] * 2704 + ids[1] * 52 + ids[2]])
+
+def result_codes(rows):
+	# unpacked 2-bit results of the given hand numbers against every hand
+	codes = np.sign(STRENGTHS[rows, None] - STRENGTHS[None, :]) + 2
+	codes[(HAND_MASKS[rows, None] & HAND_MASKS[None, :]) != 0] = 0
+	return codes.astype(np.uint8)
+
+def pack_codes(codes):
+	padded = np.zeros((len(codes), ROW_BYTES * 4), dtype=np.uint8)
+	padded[:, :N_HANDS] = codes
+	padded = padded.reshape(len(codes), ROW_BYTES, 4)
+	return (padded[:, :, 0] << 6) | (padded[:, :, 1] << 4) | (padded[:, :, 2] << 2) | padded[:, :, 3]
+
+def unpack_codes(packed):
+	codes = (packed[..., None] >> np.array([6, 4, 2, 0], dtype=np.uint8)) & 3
+	return codes.reshape(packed.shape[:-1] + (ROW_BYTES * 4,))[..., :N_HANDS]
+
+def unpack_codes_table():
+	# the four codes held by each of the 256 byte values
+	values = np.arange(256)
+	return np.stack([(values >> 6) & 3, (values >> 4) & 3, (values >> 2) & 3, values & 3], axis=1)
+
+def build_matchups(path=DEFAULT_PATH, chunk=512):
+	bucket_onehot = np.zeros((N_HANDS, len(BUCKETS)))
+	bucket_onehot[np.arange(N_HANDS), HAND_BUCKETS] = 1
+	random_equity = np.zeros(N_HANDS)
+	bucket_sums = np.zeros((len(BUCKETS), len(BUCKETS)))
+	bucket_counts = np.zeros((len(BUCKETS), len(BUCKETS)))
+	tmp_path = path + '.tmp'
+	with open(tmp_path, 'wb') as f:
+		f.write(HEADER.pack(MAGIC, VERSION, 0, N_HANDS))
+		summary_at = f.tell()
+		f.write(bytes(3 * 8 * N_HANDS + 8 * len(BUCKETS) ** 2))  # filled in below
+		for start in range(0, N_HANDS, chunk):
+			rows = np.arange(start, min(start + chunk, N_HANDS))
+			codes = result_codes(rows)
+			f.write(pack_codes(codes).tobytes())
+			valid = (codes > 0).astype(np.float64)
+			value = np.where(codes > 0, (codes.astype(np.float64) - 1) / 2, 0.0)
+			random_equity[rows] = value.sum(axis=1) / valid.sum(axis=1)
+			np.add.at(bucket_sums, HAND_BUCKETS[rows], value @ bucket_onehot)
+			np.add.at(bucket_counts, HAND_BUCKETS[rows], valid @ bucket_onehot)
+		bucket_equity = np.divide(bucket_sums, bucket_counts, out=np.full_like(bucket_sums, np.nan), where=bucket_counts > 0)
+		f.seek(summary_at)
+		f.write(STRENGTHS.tobytes())
+		f.write(random_equity.tobytes())
+		f.write(HAND_BUCKETS.tobytes())
+		f.write(bucket_equity.tobytes())
+	os.replace(tmp_path, path)
+	return path
+
+
+class MatchupTable:
+	# read-only view over a built matrix, rows are paged in as they are used
+
+	def __init__(self, path=DEFAULT_PATH):
+		with open(path, 'rb') as f:
+			self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, version, _, n_hands = HEADER.unpack_from(self.map)
+		if magic != MAGIC or version != VERSION or n_hands != N_HANDS:
+			self.map.close()
+			raise ValueError(f"{path} is not a version {VERSION} matchup table")
+		sections = []
+		offset = HEADER.size
+		for dtype, count in ((np.int64, N_HANDS), (np.float64, N_HANDS), (np.int64, N_HANDS), (np.float64, len(BUCKETS) ** 2), (np.uint8, N_HANDS * ROW_BYTES)):
+			sections.append(np.frombuffer(self.map, dtype=dtype, count=count, offset=offset))
+			offset += np.dtype(dtype).itemsize * count
+		self.strengths, self.random_equity, self.buckets, bucket_equity, packed = sections
+		self.bucket_equity = bucket_equity.reshape(len(BUCKETS), len(BUCKETS))
+		self.packed = packed.reshape(N_HANDS, ROW_BYTES)
+
+	def codes(self, hand):
+		# results of one hand (number or cards) against every hand, 0 where they share a card
+		number = hand if isinstance(hand, (int, np.integer)) else hand_number(hand)
+		return unpack_codes(self.packed[number])
+
+	def result(self, hand, other):
+		# 1, 0.5 or 0 for hand against other, None if they share a card
+		code = self.codes(hand)[other if isinstance(other, (int, np.integer)) else hand_number(other)]
+		return None if code == 0 else (code - 1) / 2
+
+	def equity_vs_range(self, hand, weights):
+		# weights is a length N_HANDS array (or {hand number: weight}), conflicting hands are dropped
+		# and the rest renormalized, the card removal a real opponent range has
+		if isinstance(weights, dict):
+			dense = np.zeros(N_HANDS)
+			dense[list(weights)] = list(weights.values())
+			weights = dense
+		codes = self.codes(hand)
+		weights = np.where(codes > 0, weights, 0.0)
+		total = weights.sum()
+		if total <= 0:
+			return None
+		return float((weights * (codes.astype(np.float64) - 1)).sum() / (2 * total))
+
+	def equities_vs_range(self, weights, chunk=64):
+		# equity of every hand against one range. The weights are folded into a table of what each
+		# possible byte contributes at each byte column (value + 1j * weight), so a row is one gather
+		# and one sum over its packed bytes instead of unpacking 22100 codes
+		padded = np.zeros(ROW_BYTES * 4)
+		padded[:N_HANDS] = weights
+		byte_codes = unpack_codes_table()
+		contributions = np.where(byte_codes > 0, byte_codes - 1.0, 0.0) + 1j * (byte_codes > 0)
+		table = (padded.reshape(ROW_BYTES, 4) @ contributions.T).astype(np.complex64)
+		columns = np.arange(ROW_BYTES)
+		result = np.empty(N_HANDS)
+		for start in range(0, N_HANDS, chunk):
+			sums = table[columns, self.packed[start:start + chunk]].sum(axis=1, dtype=np.complex128)
+			with np.errstate(invalid='ignore', divide='ignore'):
+				result[start:start + chunk] = sums.real / (2 * sums.imag)
+		return result
+
+	def equity_vs_random(self, hand):
+		number = hand if isinstance(hand, (int, np.integer)) else hand_number(hand)
+		return float(self.random_equity[number])
+
+	def equity_vs_bucket(self, hand, bucket):
+		# against every hand in the bucket, equally weighted
+		return self.equity_vs_range(hand, (self.buckets == bucket).astype(np.float64))
+
+	def bucket_vs_bucket(self, bucket, other):
+		# average over all non-conflicting hand pairs, nan if no such pair exists
+		return float(self.bucket_equity[bucket, other])
+
+	def close(self):
+		# the numpy views have to go before the map can close
+		self.strengths = self.random_equity = self.buckets = self.bucket_equity = self.packed = None
+		self.map.close()
+
+
+def open_matchups(path=DEFAULT_PATH):
+	# builds the table on first use, it only depends on the 3-card rules
+	if not os.path.exists(path):
+		build_matchups(path)
+	return MatchupTable(path)
+
+
+if __name__ == '__main__':
+	path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+	start = time.perf_counter()
+	build_matchups(path)
+	print(f"built {path} ({os.path.getsize(path) / 1e6:.0f} MB) in {time.perf_counter() - start:.1f}s")
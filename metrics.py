@@ -0,0 +1,288 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+# opt-in timings and counters for tracking down stutters. Nothing is wrapped until enable() runs,
+# so a normal launch only pays for the `if enabled` checks in inc/start/stop. enable() swaps the
+# hot functions for timing wrappers, each feeding a histogram that keeps the last WINDOW seconds
+# in SLOTS rotating slots next to its lifetime totals. Exports are a JSON snapshot of the window
+# or Prometheus text of the totals, written to a local file.
+#
+# the front ends read POKER_METRICS=path (.prom for Prometheus text, anything else JSON),
+# POKER_METRICS_EVERY=seconds between writes and POKER_PROFILE=n to cProfile the next n hands
+# into POKER_PROFILE_PATH (hands.pstats)
+BUCKETS = tuple(1e-6 * 2 ** k for k in range(24))  # 1 us .. 8 s
+WINDOW = 60
+SLOTS = 6
+EXPORT_EVERY = 10
+PROFILE_PATH = 'hands.pstats'
+HANDS = 'hands_total'
+
+enabled = False
+registry = {}
+patched = []
+profile = None
+profile_until = 0  # hands counter value that ends the capture
+profile_path = PROFILE_PATH
+
+
+def clock():
+	return time.perf_counter()
+
+
+class Histogram:
+
+	def __init__(self, name, help, buckets=BUCKETS, window=WINDOW, slots=SLOTS):
+		self.name = name
+		self.help = help
+		self.buckets = buckets
+		self.slot_length = window / slots
+		self.slots = [[0] * (len(buckets) + 1) for _ in range(slots)]
+		self.slot_sums = [0.0] * slots
+		self.epoch = int(time.monotonic() / self.slot_length)
+		self.totals = [0] * (len(buckets) + 1)
+		self.count = 0
+		self.sum = 0.0
+
+	def rotate(self):
+		# clear the slots that fell out of the window since the last observation
+		epoch = int(time.monotonic() / self.slot_length)
+		for e in range(max(self.epoch + 1, epoch - len(self.slots) + 1), epoch + 1):
+			slot = e % len(self.slots)
+			self.slots[slot] = [0] * len(self.totals)
+			self.slot_sums[slot] = 0.0
+		self.epoch = max(epoch, self.epoch)
+		return self.epoch % len(self.slots)
+
+	def observe(self, value):
+		slot = self.rotate()
+		bucket = bisect_left(self.buckets, value)
+		self.slots[slot][bucket] += 1
+		self.slot_sums[slot] += value
+		self.totals[bucket] += 1
+		self.count += 1
+		self.sum += value
+
+	def window(self):
+		self.rotate()
+		return [sum(column) for column in zip(*self.slots)], sum(self.slot_sums)
+
+	def quantile(self, q, counts=None):
+		# upper bound of the bucket holding the q-th observation of the window
+		counts = self.window()[0] if counts is None else counts
+		total = sum(counts)
+		if total == 0:
+			return None
+		seen = 0
+		for bucket, count in enumerate(counts):
+			seen += count
+			if seen >= q * total:
+				return self.buckets[bucket] if bucket < len(self.buckets) else float('inf')
+
+	def snapshot(self):
+		counts, window_sum = self.window()
+		n = sum(counts)
+		return {
+			'count': n,
+			'mean': window_sum / n if n else None,
+			'p50': self.quantile(0.5, counts),
+			'p90': self.quantile(0.9, counts),
+			'p99': self.quantile(0.99, counts),
+			'max_bucket': next((self.buckets[b] if b < len(self.buckets) else float('inf') for b in reversed(range(len(counts))) if counts[b]), None),
+			'total_count': self.count,
+			'total_sum': self.sum,
+		}
+
+	def prometheus(self):
+		lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+		cumulative = 0
+		for bound, count in zip(self.buckets, self.totals):
+			cumulative += count
+			lines.append(f'{self.name}_bucket{{le="{bound:.6g}"}} {cumulative}')
+		lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+		lines.append(f"{self.name}_sum {self.sum}")
+		lines.append(f"{self.name}_count {self.count}")
+		return lines
+
+
+class Counter:
+
+	def __init__(self, name, help, window=WINDOW, slots=SLOTS):
+		self.name = name
+		self.help = help
+		self.slot_length = window / slots
+		self.slots = [0] * slots
+		self.epoch = int(time.monotonic() / self.slot_length)
+		self.started = time.monotonic()
+		self.value = 0
+
+	def rotate(self):
+		epoch = int(time.monotonic() / self.slot_length)
+		for e in range(max(self.epoch + 1, epoch - len(self.slots) + 1), epoch + 1):
+			self.slots[e % len(self.slots)] = 0
+		self.epoch = max(epoch, self.epoch)
+		return self.epoch % len(self.slots)
+
+	def inc(self, n=1):
+		self.slots[self.rotate()] += n
+		self.value += n
+
+	def rate(self):
+		# per second over the window, or since creation while the window is still filling
+		self.rotate()
+		span = min(time.monotonic() - self.started, self.slot_length * len(self.slots))
+		return sum(self.slots) / span if span > 0 else 0.0
+
+	def snapshot(self):
+		return {'total': self.value, 'per_second': self.rate()}
+
+	def prometheus(self):
+		return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+
+def histogram(name, help=""):
+	if name not in registry:
+		registry[name] = Histogram(name, help)
+	return registry[name]
+
+def counter(name, help=""):
+	if name not in registry:
+		registry[name] = Counter(name, help)
+	return registry[name]
+
+def bump(total, n=1):
+	total.inc(n)
+	if profile is not None and total.name == HANDS and total.value >= profile_until:
+		stop_profile()
+
+def inc(name, n=1):
+	if enabled:
+		bump(counter(name), n)
+
+def start():
+	# paired with stop() around code that is not a function of its own, e.g. a loop's event handling
+	return clock() if enabled else 0.0
+
+def stop(name, started):
+	if enabled:
+		histogram(name).observe(clock() - started)
+
+
+def timed(name, help, fn):
+	hist = histogram(name, help)
+
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		started = clock()
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			hist.observe(clock() - started)
+	return wrapper
+
+def counted(name, help, fn):
+	total = counter(name, help)
+
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		bump(total)
+		return fn(*args, **kwargs)
+	return wrapper
+
+def patch(owner, attribute, wrapper):
+	original = getattr(owner, attribute)
+	setattr(owner, attribute, wrapper(original))
+	patched.append((owner, attribute, original))
+
+def enable(script=None):
+	# wrap the shared hot paths, and a front end's own functions when its module is given
+	global enabled
+	if enabled:
+		return
+	import engine
+	from strategy import StrategyStore
+	enabled = True
+	counter(HANDS, "hands dealt")
+	counter('missing_infosets_total', "bot decisions at an infoset the strategy table does not have")
+	patch(engine, 'determine_winner', lambda fn: timed('showdown_seconds', "engine.determine_winner", fn))
+	patch(StrategyStore, 'sample', lambda fn: timed('strategy_lookup_seconds', "StrategyStore.sample", fn))
+	patch(StrategyStore, 'sample_batch', lambda fn: timed('strategy_batch_seconds', "StrategyStore.sample_batch", fn))
+	render = sys.modules.get('render')  # only a front end has pygame loaded, headless runs leave it out
+	if render is not None:
+		patch(render.Renderer, 'render', lambda fn: timed('frame_seconds', "Renderer.render, painting one frame", fn))
+	if script is not None:
+		histogram('event_seconds', "one pass over a front end's event queue")
+		patch(script, 'bot_action', lambda fn: timed('bot_action_seconds', "the bot's turn", fn))
+		patch(script, 'handle_action', lambda fn: timed('action_seconds', "handle_action, one move applied", fn))
+		patch(script, 'reset_round', lambda fn: counted(HANDS, "hands dealt", fn))
+
+def disable():
+	global enabled
+	while patched:
+		owner, attribute, original = patched.pop()
+		setattr(owner, attribute, original)
+	enabled = False
+
+
+def snapshot():
+	return {name: metric.snapshot() for name, metric in sorted(registry.items())}
+
+def prometheus_text():
+	lines = []
+	for name, metric in sorted(registry.items()):
+		lines.extend(metric.prometheus())
+	return "\n".join(lines) + "\n"
+
+def write(path):
+	# atomically, so a scraper never reads half a file
+	text = prometheus_text() if path.endswith('.prom') else json.dumps(snapshot(), indent=1)
+	tmp_path = path + '.tmp'
+	with open(tmp_path, 'w') as f:
+		f.write(text)
+	os.replace(tmp_path, path)
+
+def export_every(path, seconds=EXPORT_EVERY):
+	def loop():
+		while enabled:
+			time.sleep(seconds)
+			try:
+				write(path)
+			except OSError:
+				pass
+	threading.Thread(target=loop, daemon=True).start()
+	atexit.register(write, path)
+
+
+def profile_hands(hands, path=PROFILE_PATH):
+	# cProfile from now until `hands` more hands have been counted, then dump pstats to path
+	global profile, profile_until, profile_path
+	profile_until = counter(HANDS, "hands dealt").value + hands
+	profile_path = path
+	profile = cProfile.Profile()
+	profile.enable()
+
+def stop_profile():
+	global profile
+	if profile is not None:
+		profile.disable()
+		profile.dump_stats(profile_path)
+		profile = None
+
+def setup_from_env(script=None, environ=os.environ):
+	# opt in from the environment, see the top of this file
+	path = environ.get('POKER_METRICS')
+	hands = int(environ.get('POKER_PROFILE', 0))
+	if not path and not hands:
+		return False
+	enable(script)
+	if path:
+		export_every(path, float(environ.get('POKER_METRICS_EVERY', EXPORT_EVERY)))
+	if hands:
+		profile_hands(hands, environ.get('POKER_PROFILE_PATH', PROFILE_PATH))
+	return True
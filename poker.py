@@ -1,7 +1,15 @@
 import pygame
-import random
-import itertools
-from collections import Counter
+import sys
+import engine
+import handlog
+import metrics
+from bot import random_action
+from atlas import load_atlas
+from cards import decode_hand
+from render import EXPOSE_EVENTS, Renderer, wait_for_event
+from scheduler import Scheduler
+from widgets import button_surface, card_back, render_text
+from engine import action_log, new_game, step
 
 pygame.init()
 
@@ -18,26 +26,14 @@ rank_values = {r: i for i, r in enumerate(ranks, 2)}
 FONT = pygame.font.SysFont(None, 32)
 BIG_FONT = pygame.font.SysFont(None, 48, bold=True)
 
-small_blind = 500
-big_blind = 1000
-bet_made = True
-player_is_bb = True # this starts as false because of reset_round
-bot_should_act = player_is_bb
-round_stage = 0
-pot_size = 0
+state = new_game('holdem')
+small_blind = state.small_blind
+big_blind = state.big_blind
+bot_should_act = state.player_is_bb
 bet_choice = 1
-bot_stacks = big_blind*100
-player_stacks = big_blind*100
-hands = []
-deck = []
-community_cards = []
 button_locked_until = 0
-if player_is_bb:
-	bet_history = [(1, 0.5), (0, 1)]
-else:
-	bet_history = [(0, 0.5), (1, 1)]
-show_cards = False
-pre_flop = True
+scheduler = Scheduler()
+hand_log = None
 
 
 def format_number(n):
@@ -53,70 +49,46 @@ def format_number(n):
 		return str(n)
 	
 def reset_round():
-	global small_blind, big_blind, bet_made, round_stage, hands, deck, community_cards, pot_size, player_is_bb, bot_should_act, bet_history, bet_choice, show_cards, pre_flop
-	bet_made = True
-	round_stage = 0
+	global state, bot_should_act, bet_choice
+	state = engine.reset_round(state)
+	if hand_log is not None:
+		hand_log.deal(state)
+	scheduler.cancel('bot')  # a reply queued by a click during the showdown belongs to the old hand
+	bot_should_act = state.player_is_bb
 	bet_choice = 1
-	pot_size = 0
-	player_is_bb = not player_is_bb
-	bot_should_act = not bot_should_act
-	deck = get_shuffled_deck()
-	hands = [deck[0:2], deck[2:4]]
-	community_cards = deck[4:9]
-	if player_is_bb:
-		bet_history = [(1, 0.5), (0, 1)]
-	else:
-		bet_history = [(0, 0.5), (1, 1)]
-	show_cards = False
-	pre_flop = True
 
 def load_card_images():
 	global card_images
-	for suit in suits:
-		for rank in ranks:
-			filename = f'cards/{rank}_of_{suit}.png'
-			image = pygame.image.load(filename)
-			image = pygame.transform.scale(image, (CARD_WIDTH, CARD_HEIGHT))
-			card_images[(rank, suit)] = image
-
-def get_shuffled_deck():
-	deck = [(rank, suit) for suit in suits for rank in ranks]
-	random.shuffle(deck)
-	return deck
+	card_images = load_atlas(CARD_WIDTH, CARD_HEIGHT)
 
 def draw_hand(hand, x_start, y):
-	global card_images
-	for i, card in enumerate(hand):
+	for i, card in enumerate(decode_hand(hand)):
 		screen.blit(card_images[card], (x_start + i * (CARD_WIDTH + 10), y))
 
 def draw_pot_size():
-	global pot_size
-	text = FONT.render(f"Pot: {format_number(pot_size)}", True, (255, 255, 0))
+	text = render_text(FONT, f"Pot: {format_number(state.pot_size)}", (255, 255, 0))
 	text_rect = text.get_rect(center=(WIDTH // 2, 260 + CARD_HEIGHT + 20))
 	screen.blit(text, text_rect)
 
 def draw_card_backs(x_start, y):
-	back = pygame.Surface((CARD_WIDTH, CARD_HEIGHT))
-	back.fill((255, 0, 0))
-	pygame.draw.rect(back, (255, 255, 255), back.get_rect(), 5)
+	back = card_back(CARD_WIDTH, CARD_HEIGHT)
 	for i in range(2):
 		screen.blit(back, (x_start + i * (CARD_WIDTH + 10), y))
 
 def draw_community_cards():
-	global round_stage, card_images
 	y_pos = 260
-	if round_stage >= 1:
+	community_cards = decode_hand(state.community_cards)
+	if state.round_stage >= 1:
 		for i in range(min(3, len(community_cards))):
 			screen.blit(card_images[community_cards[i]], (300 + i * (CARD_WIDTH + 10), y_pos))
-	if round_stage >= 2:
+	if state.round_stage >= 2:
 		screen.blit(card_images[community_cards[3]], (300 + 3 * (CARD_WIDTH + 10), y_pos))
-	if round_stage >= 3:
+	if state.round_stage >= 3:
 		screen.blit(card_images[community_cards[4]], (300 + 4 * (CARD_WIDTH + 10), y_pos))
 
 def draw_buttons():
-	global bet_made
-	action_label = "RAISE" if bet_made else "BET"
-	check_label = "CALL" if bet_made else "CHECK"
+	action_label = "RAISE" if state.bet_made else "BET"
+	check_label = "CALL" if state.bet_made else "CHECK"
 	actions = ['FOLD', check_label, action_label]
 	buttons = []
 
@@ -128,21 +100,15 @@ def draw_buttons():
 	reset_rect = pygame.Rect(WIDTH - 275, HEIGHT - 130, 80, 40)
 
 	for rect, label in [(minus_10_rect, "-10"), (minus_rect, "-"), (plus_rect, "+"), (plus_10_rect, "+10"), (all_in_rect, "ALL-IN"), (reset_rect, "RESET")]:
-		pygame.draw.rect(screen, (60, 60, 60), rect, border_radius=6)
-		text = FONT.render(label, True, (255, 255, 255))
-		text_rect = text.get_rect(center=rect.center)
-		screen.blit(text, text_rect)
+		screen.blit(button_surface(FONT, label, rect.size), rect)
 
-	bet_text = FONT.render(f"{bet_choice:.1f} BB ({format_number(bet_choice * big_blind)})", True, (255, 255, 255))
+	bet_text = render_text(FONT, f"{bet_choice:.1f} BB ({format_number(bet_choice * big_blind)})", (255, 255, 255))
 	screen.blit(bet_text, (WIDTH - 470, HEIGHT - 130))
 
 	for i, action in enumerate(actions):
 		width = 140 if action == 'CHECK' else 120 if action == 'FOLD' else 130 if action == "RAISE" else 110 if action == "CALL" else 95
 		rect = pygame.Rect(WIDTH - 470 + i * 150, HEIGHT - 70, width, 50)
-		pygame.draw.rect(screen, (60, 60, 60), rect, border_radius=6)
-		text = BIG_FONT.render(action, True, (255, 255, 255))
-		text_rect = text.get_rect(center=rect.center)
-		screen.blit(text, text_rect)
+		screen.blit(button_surface(BIG_FONT, action, rect.size), rect)
 		buttons.append((action, rect))
 
 	buttons.append(("+", plus_rect))
@@ -154,210 +120,87 @@ def draw_buttons():
 	return buttons
 
 def valid_raise(bet_amount):
-	highest_bet = 0
-	for i, j in bet_history:
-		if j > highest_bet:
-			highest_bet = j
-	if bet_amount >= 2*highest_bet:
-		return True
-	else:
-		return False
+	return engine.valid_raise(state, bet_amount)
 
 def choose_all_in():
 	global bet_choice
-	if bet_choice > player_stacks/big_blind:
-		bet_choice = player_stacks/big_blind
+	if bet_choice > state.player_stacks/big_blind:
+		bet_choice = state.player_stacks/big_blind
 
 def handle_action(action, bet_amount, player):
-	global bet_made, round_stage, pot_size, bot_stacks, player_stacks, bet_history, show_cards, hands, pre_flop
+	global state
+	if state.hand_over:
+		return  # clicks and bot moves that land after the showdown
+	previous = state
+	state = step(state, (player, action, bet_amount))
+	if hand_log is not None:
+		hand_log.step(previous, (player, action, bet_amount), state)
+	for line in action_log(previous, (player, action, bet_amount), state):
+		print(line)
 	if action == "FOLD":
-		print(f"{player}: FOLD")
-		if player == 0:
-			print("Bot Wins!")
-			bot_stacks += pot_size
-			highest_opp_bet = 0
-			for i, j in bet_history:
-				if i == 0 and j > highest_opp_bet:
-					highest_opp_bet = j
-			bot_stacks += highest_opp_bet * big_blind
-			player_stacks -= highest_opp_bet * big_blind
-		else:
-			print("Player Wins!")
-			player_stacks += pot_size
-			highest_opp_bet = 0
-			for i, j in bet_history:
-				if i == 1 and j > highest_opp_bet:
-					highest_opp_bet = j
-			player_stacks += highest_opp_bet * big_blind
-			bot_stacks -= highest_opp_bet * big_blind
-		if player_stacks == 0:
-			player_stacks = big_blind * 20
-		elif bot_stacks == 0:
-			bot_stacks == big_blind * 20
-		pygame.time.delay(1500)
-		reset_round()
-		return
-	elif action == "BET":
-		print(f"{player}: {action} {bet_amount} BB")
-		if pre_flop:
-			pre_flop = False
-		bet_history.append((player, bet_amount))
-		bet_made = True
-	elif action == "RAISE":
-		print(f"{player}: {action} {bet_amount} BB")
-		if pre_flop:
-			pre_flop = False
-		bet_history.append((player, bet_amount))
-		bet_made = True
-	elif action == "CALL":
-		print(f"{player}: CALL {bet_history[-1][1]} BB")
-		if pre_flop and len(bet_history) == 2:
-			bet_made = False
-			bet_history.append((player, bet_history[-1][1]))
-		else:
-			pot_size += bet_history[-1][1] * 2 * big_blind
-			player_stacks -= bet_history[-1][1] * big_blind
-			bot_stacks -= bet_history[-1][1] * big_blind
-			if round_stage >= 3:
-				show_cards = True
-				draw_hand(hands[1], 175, 50)
-				if determine_winner() == "player":
-					player_stacks += pot_size
-					print("Player Wins!")
-				elif determine_winner() == "bot":
-					bot_stacks += pot_size
-					print("Bot Wins!")
-				else:
-					player_stacks += pot_size/2
-					bot_stacks += pot_size/2
-					print("Tie!")
-			bet_made = False
-	elif action == "CHECK":
-		print(f"{player}: CHECK")
-		if (round_stage >= 3 and player == 0 and player_is_bb) or (round_stage >= 3 and player == 1 and not player_is_bb):
-			show_cards = True
-			draw_hand(hands[1], 175, 50)
-			if determine_winner() == "player":
-				player_stacks += pot_size
-				print("Player Wins!")
-			elif determine_winner() == "bot":
-				bot_stacks += pot_size
-				print("Bot Wins!")
-			else:
-				player_stacks += pot_size/2
-				bot_stacks += pot_size/2
-				print("Tie!")
-		elif pre_flop and len(bet_history) == 3:
-			pre_flop = False
-			pot_size += bet_history[-1][1] * 2 * big_blind
-			player_stacks -= bet_history[-1][1] * big_blind
-			bot_stacks -= bet_history[-1][1] * big_blind
-
-	if action == "CALL" and not pre_flop:
-		round_stage += 1
-		bet_history = []
-	elif player == 1 and action == "CHECK" and not player_is_bb:
-		round_stage += 1
-		bet_history = []
-	elif player == 0 and action == "CHECK" and player_is_bb:
-		round_stage += 1
-		bet_history = []
-
-def evaluate_hand(hand):
-	values = sorted([rank_values[card[0]] for card in hand], reverse=True)
-	suits_list = [card[1] for card in hand]
-	value_counts = Counter(values)
-	flush = len(set(suits_list)) == 1
-	straight = all(values[i] - 1 == values[i+1] for i in range(len(values) - 1))
-
-	if straight and flush:
-		return (8, values)
-	elif 4 in value_counts.values():
-		four = [v for v, count in value_counts.items() if count == 4]
-		return (7, four + [v for v in values if v not in four])
-	elif 3 in value_counts.values() and 2 in value_counts.values():
-		triple = [v for v, count in value_counts.items() if count == 3]
-		pair = [v for v, count in value_counts.items() if count == 2]
-		return (6, triple + pair)
-	elif flush:
-		return (5, values)
-	elif straight:
-		return (4, values)
-	elif 3 in value_counts.values():
-		triple = [v for v, count in value_counts.items() if count == 3]
-		return (3, triple + [v for v in values if v not in triple])
-	elif list(value_counts.values()).count(2) == 2:
-		pairs = sorted([v for v, count in value_counts.items() if count == 2], reverse=True)
-		return (2, pairs + [v for v in values if v not in pairs])
-	elif 2 in value_counts.values():
-		pair = [v for v, count in value_counts.items() if count == 2]
-		return (1, pair + [v for v in values if v not in pair])
-	else:
-		return (0, values)
-
-def determine_winner():
-	player_best = max((evaluate_hand(list(combo)) for combo in itertools.combinations(hands[0] + community_cards, 5)), key=lambda x: x)
-	bot_best = max((evaluate_hand(list(combo)) for combo in itertools.combinations(hands[1] + community_cards, 5)), key=lambda x: x)
-	if player_best > bot_best:
-		return "player"
-	elif bot_best > player_best:
-		return "bot"
-	else:
-		return "tie"
-
+		scheduler.call_later(1500, reset_round, key='reset')
 
 def bot_action():
-	global bet_made
-	action = random.choice(["CALL" if bet_made else "CHECK", "RAISE" if bet_made else "BET"])
-	if action == "RAISE":
-		bet_made = True
-	handle_action(action, 2, 1)
+	if state.hand_over:
+		return ""
+	player, action, bet_amount = random_action(state, 1)
+	handle_action(action, bet_amount, player)
 	return action
 
 def draw_player_info():
 	pygame.draw.circle(screen, (255, 255, 255), (70, 110), 60)
-	screen.blit(FONT.render("Bot", True, (0, 0, 0)), (50, 85))
-	screen.blit(FONT.render(format_number(bot_stacks), True, (0, 0, 120)), (40, 110))
+	screen.blit(render_text(FONT, "Bot", (0, 0, 0)), (50, 85))
+	screen.blit(render_text(FONT, format_number(state.bot_stacks), (0, 0, 120)), (40, 110))
 	bot_bet = 0
-	for player, bet_amount in bet_history:
+	for player, bet_amount in state.bet_history:
 		if player == 1 and bot_bet < bet_amount:
 			bot_bet = bet_amount
-	screen.blit(FONT.render(format_number(bot_bet*big_blind), True, (255, 255, 255)), (45, 200))
+	screen.blit(render_text(FONT, format_number(bot_bet*big_blind), (255, 255, 255)), (45, 200))
 	
 	pygame.draw.circle(screen, (255, 255, 255), (70, 590), 60)
-	screen.blit(FONT.render("You", True, (0, 0, 0)), (50, 565))
-	screen.blit(FONT.render(format_number(player_stacks), True, (0, 0, 120)), (40, 590))
+	screen.blit(render_text(FONT, "You", (0, 0, 0)), (50, 565))
+	screen.blit(render_text(FONT, format_number(state.player_stacks), (0, 0, 120)), (40, 590))
 	player_bet = 0
-	for player, bet_amount in bet_history:
+	for player, bet_amount in state.bet_history:
 		if player == 0 and player_bet < bet_amount:
 			player_bet = bet_amount
-	screen.blit(FONT.render(format_number(player_bet*big_blind), True, (255, 255, 255)), (45, 480))
+	screen.blit(render_text(FONT, format_number(player_bet*big_blind), (255, 255, 255)), (45, 480))
+
+
+def draw_bot_hand():
+	draw_card_backs(175, 50)
+	if state.show_cards:
+		draw_hand(state.hands[1], 175, 50)
 
+def draw_controls():
+	global buttons
+	buttons = draw_buttons()
+
+def build_renderer():
+	renderer = Renderer(screen, (0, 100, 0))
+	renderer.add('info', pygame.Rect(0, 0, 170, HEIGHT), lambda: (state.bot_stacks, state.player_stacks, tuple(state.bet_history)), draw_player_info)
+	renderer.add('hand', pygame.Rect(175, 500, 3 * (CARD_WIDTH + 10), CARD_HEIGHT), lambda: tuple(state.hands[0]), lambda: draw_hand(state.hands[0], 175, 500))
+	renderer.add('community', pygame.Rect(300, 260, 5 * (CARD_WIDTH + 10), CARD_HEIGHT), lambda: (state.round_stage, tuple(state.community_cards)), draw_community_cards)
+	renderer.add('pot', pygame.Rect(WIDTH // 2 - 200, 260 + CARD_HEIGHT + 5, 400, 30), lambda: state.pot_size, draw_pot_size)
+	renderer.add('bot_hand', pygame.Rect(175, 50, 3 * (CARD_WIDTH + 10), CARD_HEIGHT), lambda: (state.show_cards, tuple(state.hands[1])), draw_bot_hand)
+	renderer.add('controls', pygame.Rect(WIDTH - 500, HEIGHT - 180, 500, 180), lambda: (state.bet_made, bet_choice), draw_controls)
+	return renderer
 
 def main():
-	global bet_choice, button_locked_until, player_is_bb, bot_should_act
+	global bet_choice, button_locked_until, bot_should_act, hand_log
 	clock = pygame.time.Clock()
 	running = True
+	metrics.setup_from_env(sys.modules[__name__])  # POKER_METRICS / POKER_PROFILE, off by default
+	hand_log = handlog.open_from_env()  # POKER_HANDLOG=path appends every hand there
 	load_card_images()
 	reset_round()
+	renderer = build_renderer()
+	renderer.render()
 	
 	while running:
-		if round_stage >= 4:
-			if player_stacks == 0:
-				player_stacks = big_blind * 20
-			elif bot_stacks == 0:
-				bot_stacks == big_blind * 20
-			pygame.time.delay(3000)
-			reset_round()
-		screen.fill((0, 100, 0))
-		draw_player_info()
-		draw_hand(hands[0], 175, 500)
-		draw_community_cards()
-		draw_pot_size()
-		draw_card_backs(175, 50)
-		
-		buttons = draw_buttons()
-
+		scheduler.run_due()
+		if state.hand_over and not scheduler.pending('reset'):
+			scheduler.call_later(3000, reset_round, key='reset')  # leave the showdown up before dealing again
 		current_time = pygame.time.get_ticks()
 
 		if bot_should_act and current_time >= button_locked_until:
@@ -366,9 +209,12 @@ def main():
 			bot_should_act = False
 
 
+		events_started = metrics.start()
 		for event in pygame.event.get():
 			if event.type == pygame.QUIT:
 				running = False
+			elif event.type in EXPOSE_EVENTS:
+				renderer.invalidate()
 			elif event.type == pygame.MOUSEBUTTONDOWN:
 				for action, rect in buttons:
 					if rect.collidepoint(event.pos):
@@ -385,7 +231,7 @@ def main():
 						elif action == "-10" and bet_choice > 10:
 							bet_choice -= 10
 						elif action == "ALL-IN":
-							bet_choice = player_stacks/big_blind
+							bet_choice = state.player_stacks/big_blind
 						elif action == "RESET":
 							bet_choice = 1
 						elif action == "-" or action == "-10":
@@ -393,37 +239,41 @@ def main():
 						elif (action == "RAISE" or action  == "BET"):
 							if valid_raise(bet_choice):
 								button_locked_until = pygame.time.get_ticks() + 3000
-								if not player_is_bb:
+								if not state.player_is_bb:
 									handle_action(action, bet_choice, 0)
-									pygame.time.delay(1000)
-									if (action == "CALL" and not pre_flop) or action  == "FOLD":
+									if (action == "CALL" and not state.pre_flop) or action  == "FOLD":
 										continue
 									else:
-										bot_action()
+										scheduler.call_later(1000, bot_action, key='bot')
 								else:
-									if (bot_current == "CALL" and not pre_flop) or action == "FOLD":
+									if (bot_current == "CALL" and not state.pre_flop) or action == "FOLD":
 										continue
 									else:
 										handle_action(action, bet_choice, 0)
 										bot_should_act = True
 						else:
 							button_locked_until = pygame.time.get_ticks() + 3000
-							if not player_is_bb:
+							if not state.player_is_bb:
 								handle_action(action, bet_choice, 0)
-								pygame.time.delay(1000)
-								if (action == "CALL" and not pre_flop) or action == "FOLD":
+								if (action == "CALL" and not state.pre_flop) or action == "FOLD":
 									continue
 								else:
-									bot_action()
+									scheduler.call_later(1000, bot_action, key='bot')
 							else:
-								if (bot_current == "CALL" and not pre_flop) or bot_current == "FOLD":
+								if (bot_current == "CALL" and not state.pre_flop) or bot_current == "FOLD":
 									continue
 								else:
 									handle_action(action, bet_choice, 0)
 									bot_should_act = True
 							
-		pygame.display.flip()
-		clock.tick(30)
+		metrics.stop('event_seconds', events_started)
+		timeout = scheduler.timeout()
+		if bot_should_act:
+			timeout = min(timeout, button_locked_until - pygame.time.get_ticks())
+		if renderer.render():
+			clock.tick(30)
+		else:
+			wait_for_event(timeout)  # nothing to draw or do until the next click or deadline
 
 	pygame.quit()
 
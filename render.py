@@ -0,0 +1,54 @@
+import pygame
+
+# retained-mode drawing for the front ends: each widget has the screen areas it may draw in, a
+# signature function returning whatever its look depends on, and a draw function. A frame only
+# repaints the areas of widgets whose signature changed, redrawing every widget that overlaps
+# them clipped to the area, and pushes just those rects to the display
+EXPOSE_EVENTS = (pygame.VIDEOEXPOSE, getattr(pygame, 'WINDOWEXPOSED', pygame.VIDEOEXPOSE))
+MISSING = object()
+
+
+class Renderer:
+
+	def __init__(self, screen, background):
+		self.screen = screen
+		self.background = background
+		self.widgets = []
+		self.signatures = {}
+		self.full = True
+
+	def add(self, name, bounds, signature, draw):
+		# bounds is a Rect or a list of Rects covering everything draw can touch
+		self.widgets.append((name, bounds if isinstance(bounds, list) else [bounds], signature, draw))
+
+	def invalidate(self):
+		self.full = True
+
+	def render(self):
+		# returns the rects repainted this frame, empty when nothing changed
+		dirty = []
+		for name, bounds, signature, draw in self.widgets:
+			current = signature()
+			if self.signatures.get(name, MISSING) != current:
+				self.signatures[name] = current
+				dirty.extend(bounds)
+		if self.full:
+			dirty = [self.screen.get_rect()]
+			self.full = False
+		for area in dirty:
+			self.screen.set_clip(area)
+			self.screen.fill(self.background, area)
+			for name, bounds, signature, draw in self.widgets:
+				if area.collidelist(bounds) != -1:
+					draw()
+		self.screen.set_clip(None)
+		if dirty:
+			pygame.display.update(dirty)
+		return dirty
+
+
+def wait_for_event(timeout):
+	# sleep until input arrives or timeout ms pass, leaving the event queued for event.get()
+	event = pygame.event.wait(max(int(timeout), 1))
+	if event.type != pygame.NOEVENT:
+		pygame.event.post(event)
@@ -0,0 +1,135 @@
+import argparse
+import importlib
+import sys
+import time
+import engine
+import handlog
+
+# python replay.py hands.log
+# python replay.py hands.log --show 12
+# replays hand logs (handlog.py) through the engine: each hand is dealt from its logged cards,
+# blind seat and stacks, then every logged action goes through what the front ends' handle_action
+# does (ignored once the hand is over, apply_action otherwise). Any logged pot, stack, winner or
+# showdown the replay does not reproduce is a divergence. --check also flags moves the rules
+# should have stopped: actions the buttons do not offer and stacks that go below zero.
+# --show steps through one hand in its front end's window, a key or click per action
+SCRIPTS = {'threehand': '3handpoker', 'holdem': 'poker', 'switch': '3handswitchpoker'}
+BETTING = set(engine.ACTIONS[:5])
+
+
+def same(logged, value):
+	# logged chips are float32
+	return logged == value or abs(logged - value) <= 1e-6 * abs(value)
+
+def start_state(hand, state=None):
+	# the state the hand was logged from, dealt in place into state when one is given
+	if state is None or state.variant != hand['variant']:
+		state = engine.new_game(hand['variant'])
+	state.player_is_bb = not hand['player_is_bb']  # deal() moves the blind
+	engine.deal(state, deck=hand['deck'])
+	state.pot_size, state.player_stacks, state.bot_stacks = hand['start']
+	return state
+
+def replay_action(state, action, check=False):
+	# one move as handle_action makes it, returns the rule problems found when check is set
+	problems = []
+	if state.hand_over:
+		return ["action after the hand ended"]
+	player, name, bet_amount = action
+	if check and name in BETTING and name not in engine.legal_actions(state):
+		problems.append(f"{name} is not offered")
+	overdrawn = state.player_stacks < 0 or state.bot_stacks < 0
+	engine.apply_action(state, action)
+	if check and not overdrawn and (state.player_stacks < 0 or state.bot_stacks < 0):
+		problems.append(f"negative stack {state.player_stacks:g}/{state.bot_stacks:g}")
+	return problems
+
+def replay_hand(hand, state=None, check=False):
+	# the replayed final state and the hand's divergences as (action index or None, what, logged, replayed)
+	state = start_state(hand, state)
+	divergences = []
+	for i, (action, pot) in enumerate(hand['actions']):
+		for problem in replay_action(state, action, check):
+			divergences.append((i, problem, None, None))
+		if not same(pot, state.pot_size):
+			divergences.append((i, 'pot_size', pot, state.pot_size))
+	pot, player_stacks, bot_stacks = hand['end']
+	for what, logged, value in (('pot_size', pot, state.pot_size), ('player_stacks', player_stacks, state.player_stacks), ('bot_stacks', bot_stacks, state.bot_stacks)):
+		if not same(logged, value):
+			divergences.append((None, what, logged, value))
+	if hand['winner'] != state.winner:
+		divergences.append((None, 'winner', hand['winner'], state.winner))
+	if hand['showdown'] != state.show_cards:
+		divergences.append((None, 'showdown', hand['showdown'], state.show_cards))
+	return state, divergences
+
+def replay(path, check=False):
+	# (hand number, divergences) for every hand of the log, one state dealt over and over
+	state = None
+	for number, hand in enumerate(handlog.iter_hands(path)):
+		state, divergences = replay_hand(hand, state, check)
+		yield number, divergences
+
+def find_hand(path, number):
+	for i, hand in enumerate(handlog.iter_hands(path)):
+		if i == number:
+			return hand
+	raise IndexError(f"{path} has no hand {number}")
+
+
+def show(hand, check=True):
+	# steps through hand in the front end's window: any key or click for the next action, escape to stop
+	import pygame
+	module = importlib.import_module(SCRIPTS[hand['variant']])
+	module.load_card_images()
+	module.state = start_state(hand)
+	renderer = module.build_renderer()
+	renderer.render()
+	actions = hand['actions']
+	for i in range(len(actions) + 1):
+		while True:
+			event = pygame.event.wait()
+			if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+				return
+			if event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
+				break
+			if event.type in module.EXPOSE_EVENTS:
+				renderer.invalidate()
+				renderer.render()
+		if i == len(actions):
+			return
+		(player, name, bet_amount), pot = actions[i]
+		print(f"{i}: {player} {name} {bet_amount:g}")
+		if check:
+			for problem in replay_action(module.state.copy(), actions[i][0], check):
+				print(f"  {problem}")
+		module.handle_action(name, bet_amount, player)
+		if not same(pot, module.state.pot_size):
+			print(f"  pot_size {module.state.pot_size:g}, logged {pot:g}")
+		renderer.render()
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="replay hand logs and report divergences")
+	parser.add_argument('log')
+	parser.add_argument('--check', action='store_true', help="also flag actions the rules should not allow")
+	parser.add_argument('--show', type=int, metavar='HAND', help="step through this hand (0-based) in its front end's window")
+	parser.add_argument('--limit', type=int, default=20, help="divergent hands to print")
+	args = parser.parse_args()
+	if args.show is not None:
+		show(find_hand(args.log, args.show), args.check)
+		sys.exit()
+	started = time.perf_counter()
+	hands = divergent = 0
+	for number, divergences in replay(args.log, args.check):
+		hands += 1
+		if not divergences:
+			continue
+		divergent += 1
+		if divergent <= args.limit:
+			print(f"hand {number}:")
+			for index, what, logged, value in divergences:
+				where = "end" if index is None else f"action {index}"
+				print(f"  {where}: {what}" + ("" if logged is None else f" logged {logged}, replayed {value}"))
+	elapsed = time.perf_counter() - started
+	print(f"{divergent} of {hands} hands flagged, replayed in {elapsed:.1f}s ({hands / max(elapsed, 1e-9):,.0f} hands/s)", file=sys.stderr)
@@ -0,0 +1,65 @@
+import heapq
+import itertools
+import pygame
+
+# deadline queue for the front ends' pauses (bot thinking time, showing a finished hand before the
+# next deal) so the main loop keeps drawing and reading events while they wait. Callbacks run from
+# run_due() on the main loop's thread, an optional key lets a caller check or cancel a pending one
+IDLE_TIMEOUT = 1000
+
+
+def ticks():
+	return pygame.time.get_ticks()
+
+
+class Scheduler:
+
+	def __init__(self, clock=ticks):
+		self.clock = clock
+		self.queue = []
+		self.keys = {}
+		self.counter = itertools.count()
+
+	def call_later(self, delay, callback, *args, key=None):
+		# run callback(*args) once delay ms have passed, replacing any pending call with the same key
+		if key is not None:
+			self.cancel(key)
+		entry = [self.clock() + delay, next(self.counter), callback, args, key]
+		heapq.heappush(self.queue, entry)
+		if key is not None:
+			self.keys[key] = entry
+		return entry
+
+	def pending(self, key):
+		return key in self.keys
+
+	def cancel(self, key):
+		entry = self.keys.pop(key, None)
+		if entry is not None:
+			entry[2] = None  # left in the heap, skipped when it comes due
+
+	def clear(self):
+		self.queue = []
+		self.keys = {}
+
+	def run_due(self):
+		# run every callback whose deadline has passed, in deadline order, and return how many ran
+		ran = 0
+		now = self.clock()
+		while self.queue and self.queue[0][0] <= now:
+			deadline, _, callback, args, key = heapq.heappop(self.queue)
+			if callback is None:
+				continue
+			if key is not None:
+				del self.keys[key]
+			callback(*args)
+			ran += 1
+		return ran
+
+	def timeout(self, default=IDLE_TIMEOUT):
+		# ms until the next live deadline, for sleeping in between
+		while self.queue and self.queue[0][2] is None:
+			heapq.heappop(self.queue)
+		if not self.queue:
+			return default
+		return max(self.queue[0][0] - self.clock(), 0)
@@ -0,0 +1,311 @@
+import argparse
+import asyncio
+import math
+import random
+import signal
+import struct
+import sys
+import traceback
+import numpy as np
+import engine
+import handlog
+import metrics
+from bot import random_action, strategy_actions
+from strategy import open_strategy
+
+# python server.py --port 8765
+# many tables in one process, each a human seat (0) played by a client connection against the
+# bot seat (1). Tables waiting on the bot are queued and decided together on the next pass of the
+# event loop, so the strategy lookups for every table are sampled in one numpy batch.
+#
+# frames are a little-endian u16 length and a payload whose first byte is the message type.
+# client -> server: JOIN variant, ACTION table action amount, LEAVE table
+# server -> client: STATE when it is the client's turn, RESULT when a hand ends, ERROR
+#
+# --handlog PATH appends every finished hand of every table to a hand-history file (handlog.py)
+JOIN, ACTION, LEAVE, STATE, RESULT, ERROR = 1, 2, 3, 10, 11, 12
+FRAME = struct.Struct('<H')
+JOIN_MSG = struct.Struct('<BB')  # type, variant
+ACTION_MSG = struct.Struct('<BIBf')  # type, table, action, bet amount in BB
+LEAVE_MSG = struct.Struct('<BI')  # type, table
+# type, table, hand, flags, legal action mask, pot, player stack, bot stack, last bot action,
+# its amount, player hole cards, visible board
+STATE_MSG = struct.Struct('<BIIBHfffBf3s5s')
+# type, table, hand, winner, player stack, bot stack, bot hole cards
+RESULT_MSG = struct.Struct('<BIIBff3s')
+ERROR_MSG = struct.Struct('<BIB')  # type, table, error code
+
+VARIANTS = sorted(engine.VARIANTS)
+ACTIONS = engine.ACTIONS
+action_codes = engine.action_codes
+WINNERS = {"player": 0, "bot": 1, "tie": 2, None: 3}  # None: hand abandoned at MAX_ACTIONS_PER_HAND
+NO_CARD = 255
+NO_ACTION = 255
+BOARD_CARDS = (0, 3, 4, 5, 5)  # community cards shown at each round_stage
+
+# flags
+YOUR_TURN = 1
+BET_MADE = 2
+PLAYER_IS_BB = 4
+
+# error codes
+BAD_MESSAGE, BAD_VARIANT, NO_TABLE, NOT_YOUR_TURN, ILLEGAL_ACTION, TABLE_FAILED = 1, 2, 3, 4, 5, 6
+
+
+def frame(payload):
+	return FRAME.pack(len(payload)) + payload
+
+def pack_cards(cards, size):
+	return bytes(cards) + bytes([NO_CARD] * (size - len(cards)))
+
+def legal_mask(state):
+	mask = 0
+	for action in engine.legal_actions(state):
+		mask |= 1 << action_codes[action]
+	if state.variant == 'switch' and not state.card_switched:
+		visible = len(visible_board(state))  # like 3handswitchpoker.py, only revealed board cards can be swapped
+		for action in ACTIONS[5:]:
+			if action not in engine.card_value_map or engine.card_value_map[action] < visible:
+				mask |= 1 << action_codes[action]
+	return mask
+
+def valid_bet(state, amount):
+	# a client's bet or raise: a real positive size, at least double the highest bet, within the stack
+	return math.isfinite(amount) and amount > 0 and engine.valid_raise(state, amount) and amount * state.big_blind <= state.player_stacks
+
+def visible_board(state):
+	if not state.community_cards:
+		return []
+	return state.community_cards[:BOARD_CARDS[min(state.round_stage, 4)]]
+
+
+class Table:
+
+	def __init__(self, table_id, variant, connection, rng):
+		self.id = table_id
+		self.variant = variant
+		self.connection = connection
+		self.rng = rng
+		self.state = engine.new_game(variant)
+		self.hand = 0
+		self.last_action = None
+		self.closed = False
+
+	def deal(self):
+		engine.top_up(engine.deal(self.state, self.rng))
+		self.hand += 1
+		self.last_action = None
+
+	def state_message(self):
+		state = self.state
+		flags = (YOUR_TURN if state.to_act == 0 else 0) | (BET_MADE if state.bet_made else 0) | (PLAYER_IS_BB if state.player_is_bb else 0)
+		action, amount = (NO_ACTION, 0) if self.last_action is None else (action_codes[self.last_action[1]], self.last_action[2])
+		return STATE_MSG.pack(STATE, self.id, self.hand, flags, legal_mask(state), state.pot_size,
+			state.player_stacks, state.bot_stacks, action, amount, pack_cards(state.hands[0], 3), pack_cards(visible_board(state), 5))
+
+	def result_message(self):
+		state = self.state
+		return RESULT_MSG.pack(RESULT, self.id, self.hand, WINNERS[state.winner], state.player_stacks, state.bot_stacks, pack_cards(state.hands[1], 3))
+
+
+class Server:
+
+	def __init__(self, strategy_path=None, seed=None, hand_log=None):
+		self.hand_log = hand_log
+		self.strategy = open_strategy(strategy_path) if strategy_path else None
+		self.rng = random.Random(seed)
+		self.np_rng = np.random.default_rng(seed)
+		self.tables = {}
+		self.next_id = 1
+		self.waiting = []  # tables whose bot seat is to act
+		self.bot_ready = asyncio.Event()
+		self.hands = 0
+		self.batches = 0
+
+	def send(self, connection, payload):
+		if not connection.is_closing():
+			connection.write(frame(payload))
+
+	def error(self, connection, table_id, code):
+		self.send(connection, ERROR_MSG.pack(ERROR, table_id, code))
+
+	def join(self, connection, variant):
+		table = Table(self.next_id, VARIANTS[variant], connection, random.Random(self.rng.getrandbits(64)))
+		self.next_id += 1
+		self.tables[table.id] = table
+		self.deal(table)
+		self.advance(table)
+		return table
+
+	def leave(self, table):
+		table.closed = True
+		self.tables.pop(table.id, None)
+		if self.hand_log is not None:
+			self.hand_log.discard(table.id)
+
+	def fail(self, table):
+		# a table whose bot move raised: report it, close it and keep serving the others
+		print(f"table {table.id} ({table.variant}) failed, closing it", file=sys.stderr)
+		traceback.print_exc()
+		self.leave(table)
+		self.error(table.connection, table.id, TABLE_FAILED)
+
+	def deal(self, table):
+		table.deal()
+		if self.hand_log is not None:
+			self.hand_log.deal(table.state, table.id)
+
+	def apply(self, table, action):
+		engine.apply_action(table.state, action)
+		if self.hand_log is not None:
+			self.hand_log.action(table.state, action, table.id)
+
+	def act(self, connection, table_id, code, amount):
+		table = self.tables.get(table_id)
+		if table is None or table.connection is not connection:
+			return self.error(connection, table_id, NO_TABLE)
+		if table.state.to_act != 0:
+			return self.error(connection, table_id, NOT_YOUR_TURN)
+		if code >= len(ACTIONS) or not legal_mask(table.state) >> code & 1:
+			return self.error(connection, table_id, ILLEGAL_ACTION)
+		action = ACTIONS[code]
+		amount = round(amount, 2)
+		if (action == "BET" or action == "RAISE") and not valid_bet(table.state, amount):
+			return self.error(connection, table_id, ILLEGAL_ACTION)
+		self.apply(table, (0, action, amount))
+		if action in engine.card_value_map or action in engine.hand_value_map:
+			self.send(connection, table.state_message())  # still the client's turn
+			return
+		self.advance(table)
+
+	def advance(self, table):
+		# settle finished hands and hand the table to whoever acts next
+		while True:
+			state = table.state
+			if state.hand_over or state.actions_taken >= engine.MAX_ACTIONS_PER_HAND:
+				self.hands += 1
+				metrics.inc(metrics.HANDS)
+				self.send(table.connection, table.result_message())
+				if self.hand_log is not None:
+					self.hand_log.end(state, table.id)
+				self.deal(table)
+				continue
+			if state.to_act == 1:
+				self.waiting.append(table)
+				self.bot_ready.set()
+			else:
+				self.send(table.connection, table.state_message())
+			return
+
+	def bot_decisions(self, tables):
+		# one batch per variant, the threehand strategy sampled with a single numpy call
+		decisions = {}
+		by_variant = {}
+		for table in tables:
+			by_variant.setdefault(table.variant, []).append(table)
+		for variant, group in by_variant.items():
+			if variant == 'threehand' and self.strategy is not None:
+				actions = strategy_actions([table.state for table in group], 1, self.strategy, self.np_rng)
+			else:
+				actions = [random_action(table.state, 1, table.rng) for table in group]
+			for table, action in zip(group, actions):
+				decisions[table.id] = action
+		return decisions
+
+	async def bot_loop(self):
+		while True:
+			await self.bot_ready.wait()
+			self.bot_ready.clear()
+			tables = [table for table in self.waiting if not table.closed]
+			self.waiting = []
+			if not tables:
+				continue
+			self.batches += 1
+			try:
+				decisions = self.bot_decisions(tables)
+			except Exception:
+				decisions = {}
+				for table in tables:  # find the tables the batch failed on
+					try:
+						decisions.update(self.bot_decisions([table]))
+					except Exception:
+						self.fail(table)
+			for table in tables:
+				if table.closed:
+					continue
+				try:
+					table.last_action = decisions[table.id]
+					self.apply(table, table.last_action)
+					self.advance(table)
+				except Exception:
+					self.fail(table)
+			await asyncio.sleep(0)  # let connections read and queue up the next batch
+
+	async def handle_connection(self, reader, writer):
+		owned = []
+		try:
+			while True:
+				size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+				payload = await reader.readexactly(size)
+				kind = payload[0] if payload else 0
+				if kind == ACTION and size == ACTION_MSG.size:
+					_, table_id, code, amount = ACTION_MSG.unpack(payload)
+					self.act(writer, table_id, code, amount)
+				elif kind == JOIN and size == JOIN_MSG.size:
+					_, variant = JOIN_MSG.unpack(payload)
+					if variant >= len(VARIANTS):
+						self.error(writer, 0, BAD_VARIANT)
+					else:
+						owned.append(self.join(writer, variant))
+				elif kind == LEAVE and size == LEAVE_MSG.size:
+					_, table_id = LEAVE_MSG.unpack(payload)
+					table = self.tables.get(table_id)
+					if table is not None and table.connection is writer:
+						self.leave(table)
+				else:
+					self.error(writer, 0, BAD_MESSAGE)
+				await writer.drain()
+		except (asyncio.IncompleteReadError, ConnectionError):
+			pass
+		finally:
+			for table in owned:
+				self.leave(table)
+			writer.close()
+
+	async def serve(self, host, port):
+		bots = asyncio.create_task(self.bot_loop())
+		server = await asyncio.start_server(self.handle_connection, host, port)
+		print(f"serving {', '.join(VARIANTS)} tables on {host}:{port}")
+		try:
+			async with server:
+				await server.serve_forever()
+		finally:
+			bots.cancel()
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="multi-table poker server")
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--strategy', default='threehand1M.txt', help="threehand bot strategy, '' for the random bot")
+	parser.add_argument('--seed', type=int, default=None)
+	parser.add_argument('--metrics', help="write metrics here every few seconds, .prom for Prometheus text, else JSON")
+	parser.add_argument('--handlog', help="append every finished hand to this hand-history file")
+	parser.add_argument('--profile-hands', type=int, default=0, help="cProfile the first N hands into hands.pstats")
+	args = parser.parse_args()
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # exit normally so the last metrics get written
+	if args.metrics or args.profile_hands:
+		metrics.enable()
+		metrics.patch(Server, 'bot_decisions', lambda fn: metrics.timed('bot_batch_seconds', "one batch of bot decisions", fn))
+		if args.metrics:
+			metrics.export_every(args.metrics)
+		if args.profile_hands:
+			metrics.profile_hands(args.profile_hands)
+	hand_log = handlog.HandLog(args.handlog) if args.handlog else None
+	try:
+		asyncio.run(Server(args.strategy, args.seed, hand_log).serve(args.host, args.port))
+	except KeyboardInterrupt:
+		pass
+	finally:
+		if hand_log is not None:
+			hand_log.close()
@@ -0,0 +1,149 @@
+import argparse
+import math
+import os
+import random
+import time
+from multiprocessing import Pool
+import numpy as np
+import engine
+from bot import random_action, strategy_policy
+from dealer import deal_variant
+from handlog import HandLog, concat_logs
+from strategy import open_strategy
+
+# python simulate.py --hands 1000000 --player strategy --bot random
+# plays seat 0 ("player") against seat 1 ("bot") headlessly across a process pool.
+# hands are split into fixed chunks each seeded from its own SeedSequence child, so the
+# result for a given --seed does not depend on the number of workers. With --log every chunk
+# writes its hands to a part file of its own, appended to the log in chunk order at the end
+CHUNK_HANDS = 20000
+STRATEGY_VARIANTS = {'threehand'}  # the strategy tables only cover 3handpoker.py's game
+
+
+def call_action(state, player, rng=random):
+	# calling station baseline, never folds or raises
+	return (player, "CALL" if state.bet_made else "CHECK", 0)
+
+def fold_action(state, player, rng=random):
+	# folds to any bet, checks otherwise
+	return (player, "FOLD" if state.bet_made else "CHECK", 0)
+
+POLICIES = {
+	'random': lambda strategy: random_action,
+	'call': lambda strategy: call_action,
+	'fold': lambda strategy: fold_action,
+	'strategy': strategy_policy,
+}
+
+worker_strategy = None
+
+
+def init_worker(strategy_path):
+	# every worker maps the same compiled table, the pages are shared through the page cache
+	global worker_strategy
+	worker_strategy = open_strategy(strategy_path) if strategy_path else None
+
+def simulate_chunk(args):
+	variant, policy_names, n_hands, seed, log_path = args
+	policies = [POLICIES[name](worker_strategy) for name in policy_names]
+	rng = random.Random(seed)
+	decks = deal_variant(variant, n_hands, np.random.default_rng(seed))  # the whole chunk's cards in one draw
+	state = engine.new_game(variant)
+	wins = {"player": 0, "bot": 0, "tie": 0}
+	total = 0.0
+	total_sq = 0.0
+	if log_path and os.path.exists(log_path):
+		os.remove(log_path)  # left over from a run that died
+	log = HandLog(log_path) if log_path else None
+	for deck in decks:
+		engine.top_up(engine.deal(state, rng, deck))
+		start = state.player_stacks
+		engine.play_hand(state, policies, rng, log)
+		wins[state.winner] += 1
+		net = (state.player_stacks - start) / state.big_blind
+		total += net
+		total_sq += net * net
+	if log is not None:
+		log.close()
+	return n_hands, wins, total, total_sq
+
+def chunk_args(variant, policy_names, n_hands, seed, log_parts=()):
+	seeds = np.random.SeedSequence(seed).spawn(math.ceil(n_hands / CHUNK_HANDS))
+	for i, child in enumerate(seeds):
+		size = min(CHUNK_HANDS, n_hands - i * CHUNK_HANDS)
+		yield variant, policy_names, size, int(child.generate_state(1, np.uint64)[0]), log_parts[i] if log_parts else None
+
+def log_parts(log_path, n_hands):
+	return [f"{log_path}.part{i}" for i in range(math.ceil(n_hands / CHUNK_HANDS))] if log_path else []
+
+def merge(results):
+	hands = 0
+	wins = {"player": 0, "bot": 0, "tie": 0}
+	total = 0.0
+	total_sq = 0.0
+	for n, chunk_wins, chunk_total, chunk_sq in results:
+		hands += n
+		for key in wins:
+			wins[key] += chunk_wins[key]
+		total += chunk_total
+		total_sq += chunk_sq
+	return hands, wins, total, total_sq
+
+def summarize(hands, wins, total, total_sq, z=1.96):
+	# bb/100 of seat 0 with a normal-approximation confidence interval on the per-hand result
+	mean = total / hands
+	variance = max(total_sq / hands - mean * mean, 0.0) * hands / max(hands - 1, 1)
+	stderr = math.sqrt(variance / hands)
+	win_rate = wins["player"] / hands
+	win_err = math.sqrt(win_rate * (1 - win_rate) / hands)
+	return {
+		'hands': hands,
+		'wins': wins,
+		'win_rate': win_rate,
+		'win_rate_ci': (win_rate - z * win_err, win_rate + z * win_err),
+		'bb_per_100': mean * 100,
+		'bb_per_100_ci': (100 * (mean - z * stderr), 100 * (mean + z * stderr)),
+		'std_bb_per_hand': math.sqrt(variance),
+	}
+
+def simulate(variant, policy_names, n_hands, seed=0, workers=None, strategy_path='threehand1M.txt', log_path=None):
+	if 'strategy' in policy_names and variant not in STRATEGY_VARIANTS:
+		raise ValueError(f"the strategy policy only plays {', '.join(sorted(STRATEGY_VARIANTS))}, not {variant}")
+	if 'strategy' not in policy_names:
+		strategy_path = None
+	elif strategy_path:
+		open_strategy(strategy_path).close()  # compile once up front instead of racing in every worker
+	parts = log_parts(log_path, n_hands)
+	args = chunk_args(variant, policy_names, n_hands, seed, parts)
+	if workers == 1:
+		init_worker(strategy_path)
+		stats = summarize(*merge(map(simulate_chunk, args)))
+	else:
+		with Pool(workers, initializer=init_worker, initargs=(strategy_path,)) as pool:
+			stats = summarize(*merge(pool.imap_unordered(simulate_chunk, args)))
+	if parts:
+		concat_logs(parts, log_path)
+	return stats
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="headless bot-vs-bot simulation")
+	parser.add_argument('--variant', choices=sorted(engine.VARIANTS), default='threehand')
+	parser.add_argument('--player', choices=sorted(POLICIES), default='strategy', help="policy in seat 0")
+	parser.add_argument('--bot', choices=sorted(POLICIES), default='strategy', help="policy in seat 1")
+	parser.add_argument('--hands', type=int, default=1000000)
+	parser.add_argument('--workers', type=int, default=os.cpu_count())
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--strategy', default='threehand1M.txt')
+	parser.add_argument('--log', help="append every hand to this hand-history file (handlog.py)")
+	args = parser.parse_args()
+	if 'strategy' in (args.player, args.bot) and args.variant not in STRATEGY_VARIANTS:
+		parser.error(f"--player/--bot strategy only plays {', '.join(sorted(STRATEGY_VARIANTS))}, pick another policy for {args.variant}")
+
+	start = time.perf_counter()
+	stats = simulate(args.variant, (args.player, args.bot), args.hands, args.seed, args.workers, args.strategy, args.log)
+	elapsed = time.perf_counter() - start
+	print(f"{args.variant}: {args.player} vs {args.bot}, {stats['hands']} hands in {elapsed:.1f}s ({stats['hands'] / elapsed:,.0f} hands/s, {args.workers} workers)")
+	print(f"wins: {stats['wins']}")
+	print(f"win rate: {stats['win_rate']:.4f} (95% CI {stats['win_rate_ci'][0]:.4f} .. {stats['win_rate_ci'][1]:.4f})")
+	print(f"bb/100: {stats['bb_per_100']:.2f} (95% CI {stats['bb_per_100_ci'][0]:.2f} .. {stats['bb_per_100_ci'][1]:.2f}), {stats['std_bb_per_hand']:.2f} bb/hand std")
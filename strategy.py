@@ -0,0 +1,285 @@
+import ast
+import mmap
+import os
+import random
+import struct
+import sys
+import zlib
+from array import array
+import numpy as np
+from infoset import code_to_key, key_to_code
+
+# compiled layout: header, probabilities, alias probabilities, row offsets, hash slots, infoset codes, actions, aliases
+# row i of the table is infoset id i, its actions live in actions[row_offsets[i]:row_offsets[i+1]]
+# rows are sorted by infoset code, hash slots hold id + 1 (0 is empty) and are probed linearly from crc32(code)
+# each row also carries a Vose alias table so sampling an action is one uniform draw and one compare
+MAGIC = b'PKST'
+VERSION = 4
+HEADER = struct.Struct('<4sHHqqIII4x')
+
+
+def compiled_path(path):
+	return os.path.splitext(path)[0] + '.bin'
+
+def parse_strategy_line(line):
+	# lines are either "high flush[0, 1, 10], {...}" or the migrated "1083648, {...}"
+	if line[0].isdigit():
+		key_part, val_part = line.split(', ', 1)
+		return int(key_part), ast.literal_eval(val_part)
+	parts = line.split('], ', 1)
+	key_part = parts[0] + ']'  # bucket name and bet deltas
+	val_part = parts[1]
+	return key_to_code(key_part), ast.literal_eval(val_part)
+
+def parse_strategy_text(path):
+	strategy_dict = {}
+	with open(path, 'r') as f:
+		for line in f:
+			if not line.strip():
+				continue  # skip empty lines
+			code, strategy = parse_strategy_line(line.strip())
+			strategy_dict[code] = strategy
+	return strategy_dict
+
+def write_strategy_text(strategy_dict, path, int_keys=False):
+	with open(path, 'w') as f:
+		for code, strategy in strategy_dict.items():
+			key = str(code) if int_keys else code_to_key(code)
+			f.write(f"{key}, {strategy}\n")
+
+def migrate_strategy_text(path, out_path):
+	# rewrite a string-keyed strategy file with integer infoset codes
+	write_strategy_text(parse_strategy_text(path), out_path, int_keys=True)
+	return out_path
+
+def hash_code(code):
+	return zlib.crc32(code.to_bytes(4, 'little'))
+
+def build_alias(weights):
+	n = len(weights)
+	total = sum(weights)
+	if total <= 0:
+		return [1.0] * n, list(range(n))
+	scaled = [w * n / total for w in weights]
+	prob = [1.0] * n
+	alias = list(range(n))
+	small = [i for i, p in enumerate(scaled) if p < 1]
+	large = [i for i, p in enumerate(scaled) if p >= 1]
+	while small and large:
+		s = small.pop()
+		l = large.pop()
+		prob[s] = scaled[s]
+		alias[s] = l
+		scaled[l] += scaled[s] - 1
+		if scaled[l] < 1:
+			small.append(l)
+		else:
+			large.append(l)
+	return prob, alias
+
+def build_table(strategy_dict, mtime_ns=0, size=0):
+	row_offsets = array('I', [0])
+	codes = array('I')
+	actions = array('h')
+	aliases = array('h')
+	probs = array('d')
+	alias_probs = array('d')
+	table_size = 1
+	while table_size < 2 * len(strategy_dict):
+		table_size *= 2
+	slots = array('I', bytes(4 * table_size))
+	for i, code in enumerate(sorted(strategy_dict)):
+		strategy = strategy_dict[code]
+		codes.append(code)
+		actions.extend(strategy.keys())
+		probs.extend(strategy.values())
+		prob, alias = build_alias(list(strategy.values()))
+		alias_probs.extend(prob)
+		aliases.extend(alias)
+		row_offsets.append(len(actions))
+		slot = hash_code(code) & (table_size - 1)
+		while slots[slot]:
+			slot = (slot + 1) & (table_size - 1)
+		slots[slot] = i + 1
+
+	header = HEADER.pack(MAGIC, VERSION, 0, mtime_ns, size, len(strategy_dict), len(actions), table_size)
+	return header + b''.join(arr.tobytes() for arr in (probs, alias_probs, row_offsets, slots, codes, actions, aliases))
+
+def compile_strategy(path, out_path=None, strategy_dict=None):
+	if out_path is None:
+		out_path = compiled_path(path)
+	if strategy_dict is None:
+		strategy_dict = parse_strategy_text(path)
+	stat = os.stat(path)
+	tmp_path = out_path + '.tmp'
+	with open(tmp_path, 'wb') as f:
+		f.write(build_table(strategy_dict, stat.st_mtime_ns, stat.st_size))
+	os.replace(tmp_path, out_path)
+	return out_path
+
+def is_stale(path, bin_path):
+	try:
+		with open(bin_path, 'rb') as f:
+			header = f.read(HEADER.size)
+	except OSError:
+		return True
+	if len(header) < HEADER.size:
+		return True
+	magic, version, _, mtime_ns, size, _, _, _ = HEADER.unpack(header)
+	if magic != MAGIC or version != VERSION:
+		return True
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return False  # only the compiled table was shipped
+	return stat.st_mtime_ns != mtime_ns or stat.st_size != size
+
+
+class StrategyStore:
+	# read-only view over a compiled table, pages are only touched when an infoset is looked up
+	# so processes opening the same file share it through the page cache
+
+	def __init__(self, source):
+		# source is the path of a compiled table or the bytes of one built in memory
+		if isinstance(source, (bytes, bytearray)):
+			self.map = None
+			self.buffer = source
+		else:
+			with open(source, 'rb') as f:
+				self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			self.buffer = self.map
+		_, _, _, _, _, n_infosets, n_actions, table_size = HEADER.unpack_from(self.buffer)
+		self.n_infosets = n_infosets
+		self.mask = table_size - 1
+		self.layout = []
+		view = memoryview(self.buffer)
+		pos = HEADER.size
+		sections = []
+		for typecode, count in (('d', n_actions), ('d', n_actions), ('I', n_infosets + 1), ('I', table_size), ('I', n_infosets), ('h', n_actions), ('h', n_actions)):
+			nbytes = struct.calcsize(typecode) * count
+			sections.append(view[pos:pos + nbytes].cast(typecode))
+			self.layout.append((typecode, pos, count))
+			pos += nbytes
+		self.probs, self.alias_probs, self.row_offsets, self.slots, self.codes, self.actions, self.aliases = sections
+		self.arrays = None
+		view.release()
+
+	def __len__(self):
+		return self.n_infosets
+
+	def __contains__(self, code):
+		return self.find(code) >= 0
+
+	def __getitem__(self, code):
+		infoset_id = self.find(code)
+		if infoset_id < 0:
+			raise KeyError(code)
+		return self.row(infoset_id)
+
+	def find(self, code):
+		if isinstance(code, str):
+			code = key_to_code(code)
+		slot = hash_code(code) & self.mask
+		while True:
+			entry = self.slots[slot]
+			if entry == 0:
+				return -1
+			if self.codes[entry - 1] == code:
+				return entry - 1
+			slot = (slot + 1) & self.mask
+
+	def row(self, infoset_id):
+		start, end = self.row_offsets[infoset_id], self.row_offsets[infoset_id + 1]
+		return dict(zip(self.actions[start:end], self.probs[start:end]))
+
+	def sample(self, code, rng=random):
+		infoset_id = self.find(code)
+		if infoset_id < 0:
+			raise KeyError(code)
+		start = self.row_offsets[infoset_id]
+		u = rng.random() * (self.row_offsets[infoset_id + 1] - start)
+		i = int(u)
+		if u - i < self.alias_probs[start + i]:
+			return self.actions[start + i]
+		return self.actions[start + self.aliases[start + i]]
+
+	def numpy_arrays(self):
+		# zero-copy numpy views over the table, built on first use
+		if self.arrays is None:
+			self.arrays = [np.frombuffer(self.buffer, dtype=np.dtype(typecode), count=count, offset=pos) for typecode, pos, count in self.layout]
+		return self.arrays
+
+	def sample_batch(self, codes, rng=None):
+		# one action per infoset code, all drawn from a single numpy Generator stream
+		if rng is None:
+			rng = np.random.default_rng()
+		_, alias_probs, row_offsets, _, sorted_codes, actions, aliases = self.numpy_arrays()
+		codes = np.asarray(codes, dtype=np.uint32)
+		ids = np.searchsorted(sorted_codes, codes)
+		found = ids < self.n_infosets
+		found[found] = sorted_codes[ids[found]] == codes[found]
+		if not found.all():
+			raise KeyError(codes[~found][0].item())
+		start = row_offsets[ids].astype(np.int64)
+		u = rng.random(len(codes)) * (row_offsets[ids + 1] - start)
+		slot = start + u.astype(np.int64)
+		keep = (u - np.floor(u)) < alias_probs[slot]
+		return np.where(keep, actions[slot], actions[start + aliases[slot]])
+
+	def get(self, code, default=None):
+		infoset_id = self.find(code)
+		if infoset_id < 0:
+			return default
+		return self.row(infoset_id)
+
+	def keys(self):
+		return list(self.codes)
+
+	def items(self):
+		return [(self.codes[i], self.row(i)) for i in range(self.n_infosets)]
+
+	def close(self):
+		self.arrays = None
+		for section in (self.probs, self.alias_probs, self.row_offsets, self.slots, self.codes, self.actions, self.aliases):
+			section.release()
+		if self.map is not None:
+			self.map.close()
+
+
+def load_compiled(bin_path):
+	store = StrategyStore(bin_path)
+	strategy_dict = dict(store.items())
+	store.close()
+	return strategy_dict
+
+def load_strategy(path):
+	# eager dict of dicts, for tools that walk every infoset
+	bin_path = compiled_path(path)
+	if not is_stale(path, bin_path):
+		return load_compiled(bin_path)
+	strategy_dict = parse_strategy_text(path)
+	try:
+		compile_strategy(path, bin_path, strategy_dict)
+	except OSError:
+		pass  # read-only install, keep using the text file
+	return strategy_dict
+
+def open_strategy(path):
+	# memory-mapped store, compiling the text file first if the table is missing or stale
+	bin_path = compiled_path(path)
+	if is_stale(path, bin_path):
+		try:
+			compile_strategy(path, bin_path)
+		except OSError:
+			# read-only install, build the table in memory from the text file
+			return StrategyStore(build_table(parse_strategy_text(path)))
+	return StrategyStore(bin_path)
+
+
+if __name__ == '__main__':
+	# python strategy.py [files...] compiles, python strategy.py migrate src dst rewrites keys as ints
+	if sys.argv[1:2] == ['migrate']:
+		print(f"migrated {sys.argv[2]} -> {migrate_strategy_text(sys.argv[2], sys.argv[3])}")
+	else:
+		for path in sys.argv[1:] or ['threehand1M.txt']:
+			print(f"compiled {path} -> {compile_strategy(path)}")
@@ -0,0 +1,181 @@
+import itertools
+import os
+import random
+from collections import Counter
+import numpy as np
+import pytest
+import engine
+import handlog
+import replay
+from bot import random_action
+from cards import id_cards, ranks
+from evaluator import (evaluate_hand_batch, evaluate_seven_batch, evaluate_three_batch, seven_card_strength_ids,
+	three_card_strength_ids, unpack_five, unpack_three)
+from infoset import BUCKETS, DELTA_MASK, MAX_DELTAS, code_to_key, decode_infoset, encode_infoset, key_to_code
+
+# python -m pytest -q
+# the fast paths against what they replaced: the lookup evaluators against the front ends' original
+# evaluate_hand (best of the 21 five-card hands for hold'em), the numpy batches against the scalar
+# evaluators, infoset codes against their string keys, and hand logs against a replay
+rank_values = {rank: value for value, rank in enumerate(ranks, 2)}
+
+
+def three_card_hand(hand):
+	# 3handpoker.py's evaluate_hand
+	values = sorted([rank_values[card[0]] for card in hand], reverse=True)
+	value_counts = Counter(values)
+	flush = len(set(card[1] for card in hand)) == 1
+	straight = all(values[i] - 1 == values[i + 1] for i in range(len(values) - 1))
+	if straight and flush:
+		return (5, values)
+	elif 3 in value_counts.values():
+		triple = [v for v, count in value_counts.items() if count == 3]
+		return (4, triple + [v for v in values if v not in triple])
+	elif straight:
+		return (3, values)
+	elif flush:
+		return (2, values)
+	elif 2 in value_counts.values():
+		pair = [v for v, count in value_counts.items() if count == 2]
+		return (1, pair + [v for v in values if v not in pair])
+	return (0, values)
+
+def five_card_hand(hand):
+	# poker.py's evaluate_hand
+	values = sorted([rank_values[card[0]] for card in hand], reverse=True)
+	value_counts = Counter(values)
+	flush = len(set(card[1] for card in hand)) == 1
+	straight = all(values[i] - 1 == values[i + 1] for i in range(len(values) - 1))
+	if straight and flush:
+		return (8, values)
+	elif 4 in value_counts.values():
+		four = [v for v, count in value_counts.items() if count == 4]
+		return (7, four + [v for v in values if v not in four])
+	elif 3 in value_counts.values() and 2 in value_counts.values():
+		triple = [v for v, count in value_counts.items() if count == 3]
+		pair = [v for v, count in value_counts.items() if count == 2]
+		return (6, triple + pair)
+	elif flush:
+		return (5, values)
+	elif straight:
+		return (4, values)
+	elif 3 in value_counts.values():
+		triple = [v for v, count in value_counts.items() if count == 3]
+		return (3, triple + [v for v in values if v not in triple])
+	elif list(value_counts.values()).count(2) == 2:
+		pairs = sorted([v for v, count in value_counts.items() if count == 2], reverse=True)
+		return (2, pairs + [v for v in values if v not in pairs])
+	elif 2 in value_counts.values():
+		pair = [v for v, count in value_counts.items() if count == 2]
+		return (1, pair + [v for v in values if v not in pair])
+	return (0, values)
+
+def random_hands(n, k, seed=0):
+	rng = np.random.default_rng(seed)
+	return np.argsort(rng.random((n, 52)), axis=1)[:, :k].astype(np.int64)
+
+
+def test_three_card_matches_evaluate_hand():
+	for hand in itertools.combinations(range(52), 3):
+		expected = three_card_hand([id_cards[card] for card in hand])
+		assert unpack_three(three_card_strength_ids(*hand)) == expected, [id_cards[card] for card in hand]
+
+@pytest.mark.parametrize('k', [5, 6, 7])
+def test_seven_card_matches_best_of_evaluate_hand(k):
+	for hand in random_hands(2000, k, seed=k).tolist():
+		expected = max(five_card_hand([id_cards[card] for card in combo]) for combo in itertools.combinations(hand, 5))
+		assert unpack_five(seven_card_strength_ids(hand)) == expected, [id_cards[card] for card in hand]
+
+def test_seven_card_every_rank_multiset():
+	# no flushes, every way 7 ranks can fall, against the scalar evaluator the front ends use
+	hands = []
+	for ranks_held in itertools.combinations_with_replacement(range(13), 7):
+		if max(Counter(ranks_held).values()) > 4:
+			continue
+		held = Counter()
+		hand = []
+		for rank in ranks_held:
+			hand.append(rank * 4 + held[rank])
+			held[rank] += 1
+		hands.append(hand)
+	hands = np.array(hands, dtype=np.int64)
+	assert evaluate_seven_batch(hands).tolist() == [seven_card_strength_ids(hand) for hand in hands.tolist()]
+
+def test_three_batch_matches_scalar():
+	hands = random_hands(20000, 3)
+	assert evaluate_three_batch(hands).tolist() == [three_card_strength_ids(*hand) for hand in hands.tolist()]
+	assert evaluate_hand_batch(hands).tolist() == evaluate_three_batch(hands).tolist()
+
+@pytest.mark.parametrize('k', [5, 6, 7])
+def test_seven_batch_matches_scalar(k):
+	hands = random_hands(50000, k, seed=10 + k)
+	expected = [seven_card_strength_ids(hand) for hand in hands.tolist()]
+	assert evaluate_seven_batch(hands).tolist() == expected
+	assert evaluate_hand_batch(hands).tolist() == expected
+
+def test_batch_finds_every_flush_suit():
+	# one suit of five plus two off-suit cards, for every suit
+	for suit in range(4):
+		hands = random_hands(2000, 7, seed=20 + suit)
+		hands[:, :5] = np.array([rank * 4 + suit for rank in (12, 9, 7, 3, 1)])
+		hands[:, 5:] = np.array([4 * 11 + (suit + 1) % 4, 4 * 2 + (suit + 2) % 4])
+		assert evaluate_seven_batch(hands).tolist() == [seven_card_strength_ids(hand) for hand in hands.tolist()]
+
+
+def test_infoset_codes_round_trip():
+	rng = random.Random(0)
+	for bucket in range(len(BUCKETS)):
+		for length in range(MAX_DELTAS + 1):
+			for _ in range(20):
+				deltas = [rng.randint(0, DELTA_MASK) for _ in range(length)]
+				code = encode_infoset(bucket, deltas)
+				assert decode_infoset(code) == (bucket, deltas)
+				assert key_to_code(code_to_key(code)) == code
+
+def test_strategy_keys_round_trip():
+	with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'threehand1M.txt')) as f:
+		keys = [line[:line.index(']') + 1] for line in f if line.strip()]
+	assert keys
+	codes = [key_to_code(key) for key in keys]
+	assert [code_to_key(code) for code in codes] == keys
+	assert len(set(codes)) == len(keys)
+
+def test_encode_rejects_what_does_not_fit():
+	with pytest.raises(ValueError):
+		encode_infoset(0, [0] * (MAX_DELTAS + 1))
+	with pytest.raises(ValueError):
+		encode_infoset(0, [DELTA_MASK + 1])
+
+
+def sized_action(state, player, rng):
+	# random play with bet sizes the threehand engine caps
+	name = rng.choice(["CALL" if state.bet_made else "CHECK", "RAISE" if state.bet_made else "BET", "FOLD"])
+	return (player, name, rng.choice([2, 3.5, 24]))
+
+def switch_action(state, player, rng):
+	if player == 0 and not state.card_switched and rng.random() < 0.3:
+		return (player, rng.choice(engine.ACTIONS[5:]), 0)
+	return random_action(state, player, rng)
+
+@pytest.mark.parametrize('variant', sorted(engine.VARIANTS))
+def test_hand_log_replays_without_divergence(variant, tmp_path):
+	path = str(tmp_path / 'hands.log')
+	policies = [switch_action if variant == 'switch' else sized_action, random_action]
+	rng = random.Random(0)
+	state = engine.new_game(variant)
+	finals = []
+	with handlog.HandLog(path, buffer_size=4096) as log:
+		for _ in range(500):
+			engine.top_up(engine.deal(state, rng))
+			engine.play_hand(state, policies, rng, log)
+			finals.append((state.winner, state.player_stacks, state.bot_stacks))
+	replayed = []
+	for number, divergences in replay.replay(path):
+		assert divergences == [], (number, divergences)
+		replayed.append(number)
+	assert len(replayed) == len(finals)
+	for hand, (winner, player_stacks, bot_stacks) in zip(handlog.iter_hands(path), finals):
+		assert hand['winner'] == winner
+		assert replay.same(hand['end'][1], player_stacks) and replay.same(hand['end'][2], bot_stacks)
+	if variant == 'threehand':
+		assert max(amount for hand in handlog.iter_hands(path) for (_, name, amount), _ in hand['actions'] if name in ('BET', 'RAISE')) <= 20
@@ -0,0 +1,31 @@
+from functools import lru_cache
+import pygame
+
+# surfaces the front ends used to rebuild every frame. Text is kept in an LRU keyed by
+# (font, text, color) so stack and pot amounts that keep changing cannot grow it without bound,
+# buttons and card backs come from a small fixed set and are kept for good
+TEXT_CACHE_SIZE = 256
+BUTTON_COLOR = (60, 60, 60)
+TEXT_COLOR = (255, 255, 255)
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(font, text, color):
+	return font.render(text, True, color)
+
+@lru_cache(maxsize=None)
+def button_surface(font, label, size, color=BUTTON_COLOR, text_color=TEXT_COLOR, radius=6):
+	# rounded button with its label centered, corners left transparent
+	surface = pygame.Surface(size, pygame.SRCALPHA)
+	rect = surface.get_rect()
+	pygame.draw.rect(surface, color, rect, border_radius=radius)
+	text = render_text(font, label, text_color)
+	surface.blit(text, text.get_rect(center=rect.center))
+	return surface
+
+@lru_cache(maxsize=None)
+def card_back(width, height):
+	back = pygame.Surface((width, height))
+	back.fill((255, 0, 0))
+	pygame.draw.rect(back, (255, 255, 255), back.get_rect(), 5)
+	return back